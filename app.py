@@ -1,10 +1,38 @@
-from flask import Flask, render_template, request, jsonify, g, send_from_directory
-import sqlite3
+from flask import Flask, render_template, request, jsonify, g, send_from_directory, make_response, url_for, Response, stream_with_context
+from flask import before_render_template, template_rendered
+from flask.json.provider import DefaultJSONProvider
 import os
+import re
 import json
+import base64
+import binascii
+import fcntl
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from werkzeug.utils import secure_filename
+
+import schema
+import catalog_stats
+import image_variants
+import image_store
+import catalog_export
+import fuzzy_search
+import request_metrics
+import slow_queries
+from catalog_db import CatalogDB, bump_data_version
 
 app = Flask(__name__)
-DATABASE = 'golf_balls_v2.db'
+DATABASE = os.environ.get('GOLF_DB_PATH', 'golf_balls_v2.db')
+# Opt-in: copy the catalog into memory at worker start and query it there
+DB_IN_MEMORY = os.environ.get('GOLF_DB_IN_MEMORY') == '1'
+# Threads that compute the dashboard aggregates at the same time, each on
+# its own read-only connection; 1 runs them one after another
+DASHBOARD_WORKERS = int(os.environ.get('GOLF_DASHBOARD_WORKERS', catalog_stats.QUERY_WORKERS))
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -12,43 +40,306 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+# The web tier only reads; each worker thread keeps its own connection open
+catalog = CatalogDB(DATABASE, in_memory=DB_IN_MEMORY, factory=request_metrics.TimedConnection)
+
+def prepare_catalog():
+    """Bring the catalog schema (search index etc.), the precomputed stats
+    and the image store up to date before serving.
+
+    Every gunicorn worker imports this module at the same time, so this runs
+    under an exclusive lock: the first worker does the work and the rest
+    find it done.
+    """
+    with open(f'{DATABASE}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        schema.migrate(DATABASE)
+        catalog_stats.ensure(DATABASE, DASHBOARD_WORKERS)
+        image_store.import_legacy(DATABASE, UPLOAD_FOLDER, ALLOWED_EXTENSIONS)
+        catalog.prepare()
+
+prepare_catalog()
+if catalog.in_memory:
+    catalog.load_image()
+
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = catalog.connection()
     return db
 
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+# Typo-tolerant search over ball names and makers, for /api/suggest. Each
+# worker holds the index in memory: built at startup, and again whenever
+# the catalog's data version changes.
+_name_index = None  # (data version, fuzzy_search.NameIndex)
+_name_index_lock = threading.Lock()
+
+def name_index():
+    """The fuzzy name index for the current data version"""
+    global _name_index
+    version = catalog.data_version()
+    current = _name_index
+    if current is not None and current[0] == version:
+        return current[1]
+    # One thread rebuilds; the others carry on with the index they have
+    if not _name_index_lock.acquire(blocking=current is None):
+        return current[1]
+    try:
+        if _name_index is None or _name_index[0] != version:
+            _name_index = (version, fuzzy_search.NameIndex.load(catalog.connection()))
+        return _name_index[1]
+    finally:
+        _name_index_lock.release()
+
+name_index()
+
+# Runs the dashboard queries when its snapshot has not been built; each pool
+# thread gets its own connection from the catalog
+dashboard_pool = None
+if DASHBOARD_WORKERS > 1:
+    dashboard_pool = ThreadPoolExecutor(DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+# Every statement on the catalog connections is timed. Each response says
+# where its time went in a Server-Timing header, and is counted for /metrics.
+metrics = request_metrics.Metrics(os.environ.get('GOLF_METRICS_DIR') or None)
+
+# Statements slower than this are logged with their query plans; 0 turns
+# the log off
+SLOW_QUERY_MS = float(os.environ.get('GOLF_SLOW_QUERY_MS', slow_queries.DEFAULT_THRESHOLD_MS))
+slow_query_log = None
+if SLOW_QUERY_MS > 0:
+    slow_query_log = slow_queries.SlowQueryLog(
+        os.environ.get('GOLF_SLOW_QUERY_LOG', slow_queries.DEFAULT_PATH), SLOW_QUERY_MS)
+
+def route_label():
+    """The matched route's rule, e.g. /ball/<int:record_no>"""
+    return request.url_rule.rule if request.url_rule else '<unmatched>'
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts JSON serialization as render time, like template rendering"""
+    def response(self, *args, **kwargs):
+        request_metrics.render_started()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            request_metrics.render_finished()
+
+app.json = TimedJSONProvider(app)
+
+@before_render_template.connect_via(app)
+def template_started(sender, **extra):
+    request_metrics.render_started()
+
+@template_rendered.connect_via(app)
+def template_finished(sender, **extra):
+    request_metrics.render_finished()
+
+@app.before_request
+def start_timer():
+    request_metrics.start_request()
+
+@app.after_request
+def record_timing(response):
+    timer = request_metrics.current()
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+        metrics.observe(route_label(), request.method, response.status_code, timer)
+    return response
+
+@app.teardown_request
+def stop_timer(exc):
+    # After any streamed body is sent, so its fetches are counted too
+    timer = request_metrics.current()
+    if timer is not None and slow_query_log is not None:
+        slow_query_log.record(timer.statements, route_label())
+    request_metrics.finish_request()
+
+# Conditional GET for the JSON APIs. Responses depend only on the URL, the
+# data version and the deployed code, so together they make a strong ETag.
+BUILD_ID = os.environ.get('RENDER_GIT_COMMIT', 'dev')
+API_CACHE_CONTROL = 'public, max-age=60, stale-while-revalidate=600'
+
+def catalog_etag():
+    """ETag for the current request at the current data version"""
+    version = catalog.data_version()
+    digest = hashlib.sha1(f'{BUILD_ID}:{request.full_path}'.encode()).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+def conditional_json(view):
+    """Tag a JSON view's responses with catalog_etag() and Cache-Control.
+
+    A request whose If-None-Match already holds the tag gets a 304 before
+    the view runs, so no SQL is executed for it.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = catalog_etag()
+        # If-None-Match uses weak comparison (RFC 9110), e.g. after a CDN gzips
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = API_CACHE_CONTROL
+        return response
+    return wrapper
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def immutable(response):
+    if response.status_code == 200:
+        response.cache_control.immutable = True
+    return response
+
+def thumbnail_url(sha256, ext):
+    if sha256 is None:
+        return None
+    return url_for('resized_object', prefix=sha256[:2], width=image_variants.VARIANT_SIZES['thumb'],
+                   filename=image_store.object_name(sha256, ext))
+
+def image_sources(endpoint, **kwargs):
+    """src/srcset for an <img> served through one of the resizing routes"""
+    widths = image_variants.VARIANT_SIZES.values()
+    return {
+        'src': url_for(endpoint, width=image_variants.VARIANT_SIZES['medium'], **kwargs),
+        'srcset': ', '.join(f"{url_for(endpoint, width=w, **kwargs)} {w}w" for w in widths),
+    }
+
+# bm25 column weights, in schema.FTS_COLUMNS order: names matter most
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0, 1.0)
+FTS_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+def build_fts_query(text):
+    """Turn a user search string into an FTS5 MATCH expression.
+
+    "quoted text" becomes a phrase, every other word a prefix term, and all
+    terms must match. Everything is quoted so user input can never be parsed
+    as FTS5 syntax. Returns None when nothing searchable is left.
+    """
+    terms = []
+    for phrase, word in FTS_TERM_RE.findall(text):
+        if phrase.strip():
+            terms.append('"{}"'.format(phrase.strip()))
+        elif word.strip('"'):
+            terms.append('"{}"*'.format(word.strip('"').replace('"', '""')))
+    return ' AND '.join(terms) if terms else None
+
+def encode_cursor(sort, order, sort_value, record_no):
+    """Opaque keyset token: the sort key and record_no of the last row served"""
+    raw = json.dumps([sort, order, sort_value, record_no], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError on anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort, order, sort_value, record_no = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(record_no, int):
+        raise ValueError('Invalid cursor')
+    # Bound as an SQL parameter, so it must be a scalar
+    if sort_value is not None and not isinstance(sort_value, (int, float, str)):
+        raise ValueError('Invalid cursor')
+    return sort, order, sort_value, record_no
+
+def keyset_segments(sort_expr, order, sort_value, record_no):
+    """WHERE fragments selecting the rows after (sort_value, record_no).
+
+    Returns [(clause, params), ...] to be read in order until the page is
+    full. SQLite sorts NULLs first ascending and last descending, so the NULL
+    run gets its own segment; that keeps every segment a single row-value
+    comparison the planner can seek on instead of an OR it has to scan.
+    """
+    op = '>' if order == 'ASC' else '<'
+    if sort_expr.lstrip('+') == 'b.record_no':
+        return [(f'b.record_no {op} ?', [record_no])]
+    if sort_value is None:
+        segments = [(f'{sort_expr} IS NULL AND b.record_no {op} ?', [record_no])]
+        if order == 'ASC':
+            segments.append((f'{sort_expr} IS NOT NULL', []))
+        return segments
+    segments = [(f'({sort_expr}, b.record_no) {op} (?, ?)', [sort_value, record_no])]
+    if order == 'DESC':
+        segments.append((f'{sort_expr} IS NULL', []))
+    return segments
+
+# Search totals keyed by (database file signature, count SQL, params); cursor
+# pagination reads these instead of re-counting on every page
+COUNT_CACHE_SIZE = 256
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+def cached_count(db, count_sql, params):
+    """Return (total, was_cached) for a search count, counting at most once per data change"""
+    key = (catalog.signature(), count_sql, tuple(params))
+    with _count_cache_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            return _count_cache[key], True
+    
+    total = db.execute(count_sql, params).fetchone()[0]
+    with _count_cache_lock:
+        _count_cache[key] = total
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total, False
+
+BOOK_STRUCTURE_PATH = 'static/book_content/book_structure.json'
+
+# (mtime_ns, book, folios by number, (folio number, chapter id) -> (prev, next))
+_book_cache = None
+_book_cache_lock = threading.Lock()
+
+def _freeze(value):
+    """Read-only view of parsed JSON, safe to share between requests"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _index_book(book):
+    by_number = {}
+    nav = {}
+    for folio in book['folios']:
+        by_number.setdefault(folio['number'], folio)
+        chapters = folio['chapters']
+        for i, chapter in enumerate(chapters):
+            prev_ch = chapters[i - 1] if i > 0 else None
+            next_ch = chapters[i + 1] if i < len(chapters) - 1 else None
+            nav.setdefault((folio['number'], chapter['id']), (prev_ch, next_ch))
+    return MappingProxyType(by_number), MappingProxyType(nav)
+
+def _book_index():
+    """The parsed book and its lookups, reloaded only when the file changes"""
+    global _book_cache
+    mtime = os.stat(BOOK_STRUCTURE_PATH).st_mtime_ns
+    cache = _book_cache
+    if cache is not None and cache[0] == mtime:
+        return cache
+    
+    with _book_cache_lock:
+        if _book_cache is None or _book_cache[0] != mtime:
+            with open(BOOK_STRUCTURE_PATH, 'r') as f:
+                book = _freeze(json.load(f))
+            _book_cache = (mtime, book) + _index_book(book)
+        return _book_cache
+
 def load_book_structure():
-    with open('static/book_content/book_structure.json', 'r') as f:
-        return json.load(f)
+    return _book_index()[1]
 
 def get_current_folio(folio_num=1):
     """Get current folio data"""
-    book = load_book_structure()
-    for folio in book['folios']:
-        if folio['number'] == folio_num:
-            return folio
-    return book['folios'][0]
+    _, book, by_number, _ = _book_index()
+    return by_number.get(folio_num, book['folios'][0])
 
 def get_chapter_nav(folio, current_id):
     """Get previous and next chapter for navigation"""
-    chapters = folio['chapters']
-    current_idx = next((i for i, ch in enumerate(chapters) if ch['id'] == current_id), None)
-    
-    prev_ch = chapters[current_idx - 1] if current_idx and current_idx > 0 else None
-    next_ch = chapters[current_idx + 1] if current_idx is not None and current_idx < len(chapters) - 1 else None
-    
-    return prev_ch, next_ch
+    return _book_index()[3].get((folio['number'], current_id), (None, None))
 
 # Book Routes
 @app.route('/')
@@ -113,15 +404,22 @@ def book_chapter(chapter_id, folio_num=1):
                           next_chapter=next_ch)
 
 # Browse/Database Routes
+BROWSE_OPTION_QUERIES = {
+    'eras': 'SELECT DISTINCT era FROM golf_balls WHERE era IS NOT NULL ORDER BY era_sort, era',
+    'patterns': 'SELECT DISTINCT cover_pattern FROM golf_balls WHERE cover_pattern IS NOT NULL ORDER BY cover_pattern',
+    'countries': 'SELECT DISTINCT country FROM golf_balls WHERE country IS NOT NULL ORDER BY country',
+    'conditions': 'SELECT DISTINCT condition_grade FROM golf_balls WHERE condition_grade IS NOT NULL ORDER BY condition_grade',
+}
+
 @app.route('/browse')
 def browse():
     db = get_db()
     
     # Get filter options
-    eras = db.execute('SELECT DISTINCT era FROM golf_balls WHERE era IS NOT NULL ORDER BY era_sort, era').fetchall()
-    patterns = db.execute('SELECT DISTINCT cover_pattern FROM golf_balls WHERE cover_pattern IS NOT NULL ORDER BY cover_pattern').fetchall()
-    countries = db.execute('SELECT DISTINCT country FROM golf_balls WHERE country IS NOT NULL ORDER BY country').fetchall()
-    conditions = db.execute('SELECT DISTINCT condition_grade FROM golf_balls WHERE condition_grade IS NOT NULL ORDER BY condition_grade').fetchall()
+    eras = db.execute(BROWSE_OPTION_QUERIES['eras']).fetchall()
+    patterns = db.execute(BROWSE_OPTION_QUERIES['patterns']).fetchall()
+    countries = db.execute(BROWSE_OPTION_QUERIES['countries']).fetchall()
+    conditions = db.execute(BROWSE_OPTION_QUERIES['conditions']).fetchall()
     
     # Get stats
     stats = db.execute('''
@@ -145,119 +443,322 @@ def browse():
                           stats=stats,
                           folios=folios)
 
-@app.route('/api/search')
-def search():
-    db = get_db()
-    
-    # Get query parameters
-    query = request.args.get('q', '').strip()
-    folio = request.args.get('folio', '')  # Empty = all folios
-    era = request.args.get('era', '')
-    pattern = request.args.get('pattern', '')
-    country = request.args.get('country', '')
-    condition = request.args.get('condition', '')
-    min_val = request.args.get('min_value', '')
-    max_val = request.args.get('max_value', '')
-    sort = request.args.get('sort', 'value_mid')
-    order = request.args.get('order', 'DESC')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
-    
-    # Build query
+VALID_SORTS = ['value_mid', 'ball_name', 'era_sort', 'record_no', 'condition_grade']
+
+def build_search_query(args):
+    """Translate /api/search style arguments into SQL fragments.
+
+    Returns a dict with the FROM clause, WHERE clause and its params, and
+    the resolved sort column/expression and direction. Shared by every endpoint
+    that filters the catalog the way the browse page does.
+    """
+    query = args.get('q', '').strip()
+    folio = args.get('folio', '')  # Empty = all folios
+    era = args.get('era', '')
+    pattern = args.get('pattern', '')
+    country = args.get('country', '')
+    condition = args.get('condition', '')
+    min_val = args.get('min_value', '')
+    max_val = args.get('max_value', '')
+    has_image = args.get('has_image', '')
+    sort = args.get('sort', 'relevance' if query else 'value_mid')
+    order = args.get('order', 'DESC')
+    
+    from_sql = 'golf_balls b'
     where_clauses = []
     params = []
     
+    # The FTS match always runs once, up front. Left to itself SQLite may
+    # start from a filter's index instead and run the whole MATCH again for
+    # every row that passes the filter. Ranking needs the FTS row for bm25,
+    # so it joins with the FTS table as the outer loop; other sorts only
+    # need to know which rows matched.
+    match_expr = build_fts_query(query) if query else None
+    ranked = match_expr is not None and sort == 'relevance'
+    if ranked:
+        from_sql = 'golf_balls_fts CROSS JOIN golf_balls b ON b.record_no = golf_balls_fts.rowid'
+        where_clauses.append('golf_balls_fts MATCH ?')
+        params.append(match_expr)
+    elif match_expr:
+        where_clauses.append('b.record_no IN (SELECT rowid FROM golf_balls_fts WHERE golf_balls_fts MATCH ?)')
+        params.append(match_expr)
+    elif query:
+        # Nothing searchable in it (say, a lone quote) - match nothing, as a
+        # search for punctuation does
+        where_clauses.append('0')
+    
     # Folio filter
     if folio and folio != '':
-        where_clauses.append('folio = ?')
+        where_clauses.append('b.folio = ?')
         params.append(int(folio))
     
-    if query:
-        where_clauses.append('''
-            (ball_name LIKE ? OR 
-             manufacturer LIKE ? OR 
-             ball_name_format LIKE ? OR
-             specs LIKE ? OR
-             auction_remarks LIKE ?)
-        ''')
-        like_term = f'%{query}%'
-        params.extend([like_term] * 5)
-    
     if era:
-        where_clauses.append('era = ?')
+        where_clauses.append('b.era = ?')
         params.append(era)
     
     if pattern:
-        where_clauses.append('cover_pattern = ?')
+        where_clauses.append('b.cover_pattern = ?')
         params.append(pattern)
     
     if country:
-        where_clauses.append('country = ?')
+        where_clauses.append('b.country = ?')
         params.append(country)
     
     if condition:
-        where_clauses.append('condition_grade = ?')
+        where_clauses.append('b.condition_grade = ?')
         params.append(condition)
     
     if min_val:
-        where_clauses.append('value_mid >= ?')
+        where_clauses.append('b.value_mid >= ?')
         params.append(float(min_val))
     
     if max_val:
-        where_clauses.append('value_mid <= ?')
+        where_clauses.append('b.value_mid <= ?')
         params.append(float(max_val))
     
-    where_sql = ' AND '.join(where_clauses) if where_clauses else '1=1'
+    if has_image:
+        negate = 'NOT ' if has_image.lower() in ('0', 'false', 'no') else ''
+        where_clauses.append(f'b.record_no {negate}IN (SELECT record_no FROM ball_images)')
+    
+    # Validate sort column; text searches rank by relevance unless told otherwise
+    if ranked:
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        sort_expr = f'bm25(golf_balls_fts, {weights})'
+        order = 'ASC'
+    else:
+        if sort not in VALID_SORTS:
+            sort = 'value_mid'
+        sort_expr = f'b.{sort}'
+        # Rowid order would let SQLite walk the whole table filtering as it
+        # goes; with a filter present, the unary + makes it use the filter's
+        # index and sort the matches instead
+        if sort == 'record_no' and where_clauses:
+            sort_expr = '+b.record_no'
+        order = 'ASC' if order.upper() == 'ASC' else 'DESC'
+    
+    return {
+        'from_sql': from_sql,
+        'where_sql': ' AND '.join(where_clauses) if where_clauses else '1=1',
+        'params': params,
+        'sort': sort,
+        'sort_expr': sort_expr,
+        'order': order,
+        'order_sql': f'{sort_expr} {order}, b.record_no {order}',
+    }
+
+def search_count_sql(sq):
+    """COUNT query for a build_search_query result"""
+    return f"SELECT COUNT(*) FROM {sq['from_sql']} WHERE {sq['where_sql']}"
+
+def search_page_sql(sq, keyset=None):
+    """Page query for a build_search_query result, with each ball's primary
+    image; binds the WHERE params, then the keyset params if any, then LIMIT
+    and OFFSET"""
+    where_sql = f"{sq['where_sql']} AND {keyset}" if keyset else sq['where_sql']
+    return f'''
+        SELECT b.*, {sq['sort_expr']} AS sort_key,
+               img.sha256 AS image_sha256, img.ext AS image_ext
+        FROM {sq['from_sql']}
+        LEFT JOIN ball_images img ON img.record_no = b.record_no AND img.is_primary = 1
+        WHERE {where_sql}
+        ORDER BY {sq['order_sql']}
+        LIMIT ? OFFSET ?
+    '''
+
+def search_export_sql(sq):
+    """Every matching row, for streaming out with fetchmany"""
+    return f'''
+        SELECT b.* FROM {sq['from_sql']}
+        WHERE {sq['where_sql']}
+        ORDER BY {sq['order_sql']}
+    '''
+
+FACET_COLUMNS = catalog_stats.FACET_COLUMNS
+
+def facet_sql(sq):
+    """One GROUP BY over all facet columns for the matching rows. Grouping in
+    idx_facets order lets SQLite answer it from that index alone."""
+    columns = ', '.join(f'b.{column}' for column in FACET_COLUMNS.values())
+    return f'''
+        SELECT {columns}, COUNT(*) FROM {sq['from_sql']}
+        WHERE {sq['where_sql']}
+        GROUP BY {columns}
+    '''
+
+def facet_counts(db, args, facets):
+    """Per-value counts for each requested facet: how many balls picking
+    that value would give, with every other filter kept as it is.
+
+    A single pass counts every combination of facet values among the balls
+    matching the non-facet filters (text, value range, images). A facet's
+    counts then add up the combinations that pass the other facets'
+    filters, so asking for four facets costs one query rather than four.
+    With no filters at all the counts are read from the stored snapshot.
+    """
+    sq = build_search_query({key: value for key, value in args.items() if key not in FACET_COLUMNS})
+    selected = {name: args.get(name, '') for name in FACET_COLUMNS}
+    selected = {name: int(value) if name == 'folio' else value for name, value in selected.items() if value}
+    if sq['where_sql'] == '1=1' and not selected:
+        snapshot = catalog_stats.load(db, 'facets')
+        return {name: snapshot[name] for name in facets}
+    positions = {name: i for i, name in enumerate(FACET_COLUMNS)}
+    counts = {name: {} for name in facets}
+    for row in db.execute(facet_sql(sq), sq['params']):
+        n = row[-1]
+        # Filters this combination fails; it still counts for the facet of
+        # the one it fails, if only one
+        failed = [name for name, value in selected.items() if row[positions[name]] != value]
+        if len(failed) > 1:
+            continue
+        for name in facets:
+            value = row[positions[name]]
+            if value is not None and failed in ([], [name]):
+                counts[name][value] = counts[name].get(value, 0) + n
+    return {
+        name: [{'value': value, 'count': n}
+               for value, n in sorted(values.items(), key=lambda item: (-item[1], str(item[0])))]
+        for name, values in counts.items()
+    }
+
+def search_result(row):
+    """A ball as search listings return it, from a row with image_sha256/image_ext"""
+    return {
+        'record_no': row['record_no'],
+        'ball_name': row['ball_name'],
+        'ball_name_format': row['ball_name_format'],
+        'era': row['era'],
+        'era_start': row['era_start'],
+        'cover_pattern': row['cover_pattern'],
+        'manufacturer': row['manufacturer'],
+        'value_mid': row['value_mid'],
+        'currency': row['currency'],
+        'country': row['country'],
+        'condition_grade': row['condition_grade'],
+        'rarity_score': row['rarity_score'],
+        'folio': row['folio'],
+        'thumbnail_url': thumbnail_url(row['image_sha256'], row['image_ext'])
+    }
+
+@app.route('/api/search')
+@conditional_json
+def search():
+    db = get_db()
     
-    # Validate sort column
-    valid_sorts = ['value_mid', 'ball_name', 'era_sort', 'record_no', 'condition_grade']
-    if sort not in valid_sorts:
-        sort = 'value_mid'
+    # Get query parameters
+    folio = request.args.get('folio', '')  # Empty = all folios
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
+    # Passing cursor (empty for the first page) switches to keyset pagination
+    cursor = request.args.get('cursor')
+    count_mode = request.args.get('count', 'exact' if cursor is None else 'cached')
+    if per_page < 1:
+        return jsonify({'error': 'per_page must be at least 1'}), 400
     
-    order = 'ASC' if order.upper() == 'ASC' else 'DESC'
+    # Build query
+    sq = build_search_query(request.args)
+    params = list(sq['params'])
+    sort, order = sq['sort'], sq['order']
     
     # Get total count
-    count_sql = f'SELECT COUNT(*) FROM golf_balls WHERE {where_sql}'
-    total = db.execute(count_sql, params).fetchone()[0]
+    count_sql = search_count_sql(sq)
+    if count_mode == 'cached':
+        total, total_cached = cached_count(db, count_sql, params)
+    else:
+        total, total_cached = db.execute(count_sql, params).fetchone()[0], False
     
     # Get results
-    offset = (page - 1) * per_page
-    sql = f'''
-        SELECT * FROM golf_balls 
-        WHERE {where_sql}
-        ORDER BY {sort} {order}
-        LIMIT ? OFFSET ?
-    '''
-    params.extend([per_page, offset])
-    
-    rows = db.execute(sql, params).fetchall()
+    if cursor is None:
+        offset = (page - 1) * per_page
+        rows = db.execute(search_page_sql(sq), params + [per_page, offset]).fetchall()
+    else:
+        # Keyset: seek past the last row served, fetching one extra row to
+        # tell whether another page follows
+        segments = [(None, [])]
+        if cursor:
+            try:
+                cur_sort, cur_order, sort_value, last_record = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if (cur_sort, cur_order) != (sort, order):
+                return jsonify({'error': 'Cursor does not match sort order'}), 400
+            segments = keyset_segments(sq['sort_expr'], order, sort_value, last_record)
+        
+        rows = []
+        for keyset, keyset_params in segments:
+            wanted = per_page + 1 - len(rows)
+            if wanted <= 0:
+                break
+            rows += db.execute(search_page_sql(sq, keyset), params + keyset_params + [wanted, 0]).fetchall()
+    
+    next_cursor = None
+    if cursor is not None and len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(sort, order, rows[-1]['sort_key'], rows[-1]['record_no'])
+    
+    results = [search_result(row) for row in rows]
+    
+    if cursor is not None:
+        response = {
+            'results': results,
+            'total': total,
+            'total_cached': total_cached,
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'folio': folio
+        }
+    else:
+        response = {
+            'results': results,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page,
+            'folio': folio
+        }
+    
+    # Optional per-value counts, e.g. facets=era,country
+    facets = [name.strip() for name in request.args.get('facets', '').split(',') if name.strip()]
+    if facets:
+        unknown = [name for name in facets if name not in FACET_COLUMNS]
+        if unknown:
+            return jsonify({'error': f"Unknown facet: {', '.join(unknown)}"}), 400
+        response['facets'] = facet_counts(db, request.args, facets)
+    
+    return jsonify(response)
+
+# Most matches /api/suggest returns
+MAX_SUGGESTIONS = 50
+
+@app.route('/api/suggest')
+@conditional_json
+def suggest():
+    """Balls whose names or maker look like q, most similar first.
+
+    Tolerates typos ("Forgen" finds Forgan) and treats the last word as
+    still being typed unless q ends in a space; fast enough to call on
+    every keystroke.
+    """
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), MAX_SUGGESTIONS))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    total, matches = name_index().search(query, limit)
+    rows = {}
+    if matches:
+        rows = {row['record_no']: row for row in get_db().execute('''
+            SELECT b.*, img.sha256 AS image_sha256, img.ext AS image_ext
+            FROM golf_balls b
+            LEFT JOIN ball_images img ON img.record_no = b.record_no AND img.is_primary = 1
+            WHERE b.record_no IN (SELECT value FROM json_each(?))
+        ''', (json.dumps([record_no for record_no, _ in matches]),))}
     
     results = []
-    for row in rows:
-        results.append({
-            'record_no': row['record_no'],
-            'ball_name': row['ball_name'],
-            'ball_name_format': row['ball_name_format'],
-            'era': row['era'],
-            'era_start': row['era_start'],
-            'cover_pattern': row['cover_pattern'],
-            'manufacturer': row['manufacturer'],
-            'value_mid': row['value_mid'],
-            'currency': row['currency'],
-            'country': row['country'],
-            'condition_grade': row['condition_grade'],
-            'rarity_score': row['rarity_score'],
-            'folio': row['folio']
-        })
-    
-    return jsonify({
-        'results': results,
-        'total': total,
-        'page': page,
-        'per_page': per_page,
-        'pages': (total + per_page - 1) // per_page,
-        'folio': folio
-    })
+    for record_no, score in matches:
+        if record_no in rows:
+            results.append(dict(search_result(rows[record_no]), score=score))
+    return jsonify({'query': query, 'total': total, 'results': results})
 
 @app.route('/ball/<int:record_no>')
 def ball_detail(record_no):
@@ -266,11 +767,9 @@ def ball_detail(record_no):
     if ball is None:
         return "Ball not found", 404
     
-    # Check for uploaded images
-    ball_images = []
-    ball_folder = os.path.join(app.config['UPLOAD_FOLDER'], f'ball_{record_no}')
-    if os.path.exists(ball_folder):
-        ball_images = [f for f in os.listdir(ball_folder) if allowed_file(f)]
+    ball_images = [image_sources('resized_object', prefix=image['sha256'][:2],
+                                 filename=image_store.object_name(image['sha256'], image['ext']))
+                   for image in image_store.ball_images(db, record_no)]
     
     # Load folios for navigation
     book = load_book_structure()
@@ -278,6 +777,7 @@ def ball_detail(record_no):
     return render_template('detail.html', ball=ball, images=ball_images, folios=book['folios'])
 
 @app.route('/api/ball/<int:record_no>')
+@conditional_json
 def api_ball_detail(record_no):
     db = get_db()
     row = db.execute('SELECT * FROM golf_balls WHERE record_no = ?', (record_no,)).fetchone()
@@ -286,12 +786,124 @@ def api_ball_detail(record_no):
     
     result = dict(row)
     result['folio'] = 1  # Current folio
+    result['images'] = [{
+        'url': image_store.object_url(image['sha256'], image['ext']),
+        'thumbnail_url': thumbnail_url(image['sha256'], image['ext']),
+        'width': image['width'],
+        'height': image['height'],
+        'size_bytes': image['size_bytes'],
+        'primary': bool(image['is_primary']),
+    } for image in image_store.ball_images(db, record_no)]
     return jsonify(result)
 
+# Most ids /api/balls looks up per request
+MAX_BATCH_IDS = 500
+
+def ball_fields(db):
+    """Column names of golf_balls, in table order"""
+    return [d[0] for d in db.execute('SELECT * FROM golf_balls LIMIT 0').description]
+
+def parse_ids(values):
+    """Record numbers from a list of ints or comma-separated strings,
+    de-duplicated in order"""
+    ids = []
+    for value in values:
+        parts = value.split(',') if isinstance(value, str) else [value]
+        for part in parts:
+            if isinstance(part, str) and not part.strip():
+                continue
+            # JSON bodies: ints only, not floats or true/false
+            if isinstance(part, bool) or not isinstance(part, (int, str)):
+                raise ValueError(f'Invalid id: {part!r}')
+            try:
+                ids.append(int(part))
+            except ValueError:
+                raise ValueError(f'Invalid id: {part!r}')
+    return list(dict.fromkeys(ids))
+
+def batch_lookup(ids, fields):
+    """Compact JSON for many balls: one row of values per ball, in the
+    requested order, plus the ids that don't exist"""
+    if not ids:
+        return jsonify({'error': 'No ids given'}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+    
+    db = get_db()
+    available = ball_fields(db)
+    if fields:
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            return jsonify({'error': f"Unknown field: {', '.join(unknown)}"}), 400
+        fields = ['record_no'] + [f for f in dict.fromkeys(fields) if f != 'record_no']
+    else:
+        fields = available
+    
+    # The ids travel as one JSON array, so every batch size shares the same
+    # prepared statement
+    columns = ', '.join(fields)
+    rows = db.execute(f'''
+        SELECT {columns} FROM golf_balls
+        WHERE record_no IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(ids),)).fetchall()
+    by_id = {row['record_no']: list(row) for row in rows}
+    
+    return jsonify({
+        'fields': fields,
+        'rows': [by_id[n] for n in ids if n in by_id],
+        'missing': [n for n in ids if n not in by_id],
+    })
+
+@app.route('/api/balls')
+@conditional_json
+def api_balls():
+    """Many balls at once: ?ids=1,2,3 and optionally &fields=ball_name,value_mid"""
+    try:
+        ids = parse_ids(request.args.getlist('ids'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    fields = [f for value in request.args.getlist('fields') for f in value.split(',') if f]
+    return batch_lookup(ids, fields)
+
+@app.route('/api/balls', methods=['POST'])
+def api_balls_post():
+    """Same as GET /api/balls, for id lists too long for a URL:
+    {"ids": [1, 2, 3], "fields": ["ball_name", "value_mid"]}"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    ids, fields = body.get('ids', []), body.get('fields') or []
+    if not isinstance(ids, list) or not isinstance(fields, list):
+        return jsonify({'error': 'ids and fields must be lists'}), 400
+    try:
+        ids = parse_ids(ids)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return batch_lookup(ids, [str(f) for f in fields])
+
 @app.route('/uploads/ball_<int:record_no>/<filename>')
 def uploaded_file(record_no, filename):
     return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER'], f'ball_{record_no}'), filename)
 
+@app.route('/uploads/objects/<prefix>/<filename>')
+def object_file(prefix, filename):
+    # Named by content hash, so a given URL always returns the same bytes
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], image_store.OBJECTS_DIR, secure_filename(prefix))
+    return immutable(send_from_directory(folder, filename, max_age=image_store.IMMUTABLE_MAX_AGE))
+
+@app.route('/uploads/objects/<prefix>/w<int:width>/<filename>')
+def resized_object(prefix, width, filename):
+    """Serve the smallest variant of a stored image that is at least `width`
+    wide, as WebP when the browser accepts it"""
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], image_store.OBJECTS_DIR, secure_filename(prefix))
+    filename = secure_filename(filename)
+    accept_webp = request.accept_mimetypes['image/webp'] > 0
+    variants = image_store.stored_variants(get_db(), filename)
+    variant = image_variants.pick_variant(filename, variants, width, accept_webp)
+    response = send_from_directory(folder, variant, max_age=image_store.IMMUTABLE_MAX_AGE)
+    response.vary.add('Accept')
+    return immutable(response)
+
 @app.route('/api/ball/<int:record_no>/upload', methods=['POST'])
 def upload_image(record_no):
     if 'file' not in request.files:
@@ -302,84 +914,70 @@ def upload_image(record_no):
         return jsonify({'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        ball_folder = os.path.join(app.config['UPLOAD_FOLDER'], f'ball_{record_no}')
-        os.makedirs(ball_folder, exist_ok=True)
-        
-        filename = f"{len(os.listdir(ball_folder)) + 1}_{file.filename}"
-        filepath = os.path.join(ball_folder, filename)
-        file.save(filepath)
+        image = image_store.add_image(DATABASE, app.config['UPLOAD_FOLDER'], record_no,
+                                      file.stream, file.filename)
+        if image['linked']:
+            bump_data_version(DATABASE)
         
         return jsonify({
             'success': True,
-            'filename': filename,
-            'url': f'/uploads/ball_{record_no}/{filename}'
+            'filename': image['filename'],
+            'sha256': image['sha256'],
+            'duplicate': image['duplicate'],
+            'url': image_store.object_url(image['sha256'], image['ext']),
+            'thumbnail_url': thumbnail_url(image['sha256'], image['ext'])
         })
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/export')
+def export():
+    """Stream every ball matching the /api/search filters as CSV, NDJSON or
+    Parquet. Rows come in record order unless a sort is given."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in catalog_export.FORMATS:
+        return jsonify({'error': f'Unknown format: {fmt}'}), 400
+    if fmt == 'parquet' and not catalog_export.parquet_available():
+        return jsonify({'error': 'Parquet export is not available on this server'}), 501
+    
+    args = request.args.to_dict()
+    args.setdefault('sort', 'record_no')
+    args.setdefault('order', 'ASC')
+    sq = build_search_query(args)
+    
+    db = get_db()
+    column_types = {row['name']: row['type'] for row in db.execute('PRAGMA table_info(golf_balls)')}
+    cursor = db.execute(search_export_sql(sq), sq['params'])
+    chunks = catalog_export.WRITERS[fmt](cursor, column_types)
+    
+    mimetype, extension = catalog_export.FORMATS[fmt]
+    # Parquet is compressed already
+    compress = fmt != 'parquet' and request.accept_encodings['gzip'] > 0
+    if compress:
+        chunks = catalog_export.gzip_chunks(chunks)
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=golf_balls.{extension}'
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 @app.route('/stats')
 def stats():
-    db = get_db()
-    
-    # Various statistics
-    by_pattern = db.execute('''
-        SELECT cover_pattern, COUNT(*) as count, AVG(value_mid) as avg_value
-        FROM golf_balls
-        WHERE cover_pattern IS NOT NULL
-        GROUP BY cover_pattern
-        ORDER BY count DESC
-    ''').fetchall()
-    
-    by_era = db.execute('''
-        SELECT era, COUNT(*) as count, AVG(value_mid) as avg_value
-        FROM golf_balls
-        WHERE era IS NOT NULL
-        GROUP BY era
-        ORDER BY era_sort
-    ''').fetchall()
-    
-    by_country = db.execute('''
-        SELECT country, COUNT(*) as count, AVG(value_mid) as avg_value
-        FROM golf_balls
-        WHERE country IS NOT NULL
-        GROUP BY country
-        ORDER BY count DESC
-    ''').fetchall()
-    
-    by_condition = db.execute('''
-        SELECT condition_grade, COUNT(*) as count, AVG(value_mid) as avg_value
-        FROM golf_balls
-        WHERE condition_grade IS NOT NULL
-        GROUP BY condition_grade
-        ORDER BY condition_grade
-    ''').fetchall()
-    
-    # Folio breakdown
-    by_folio = db.execute('''
-        SELECT folio, COUNT(*) as count, AVG(value_mid) as avg_value, currency
-        FROM golf_balls
-        WHERE folio IS NOT NULL
-        GROUP BY folio
-        ORDER BY folio
-    ''').fetchall()
-    
-    top_valuable = db.execute('''
-        SELECT record_no, ball_name, era, value_mid, manufacturer, condition_grade, folio, currency
-        FROM golf_balls
-        ORDER BY value_mid DESC
-        LIMIT 20
-    ''').fetchall()
+    # Aggregates are precomputed at import time
+    snapshot = catalog_stats.load(get_db(), 'stats_page')
     
     # Load folios
     book = load_book_structure()
     
     return render_template('stats.html',
-                          by_pattern=by_pattern,
-                          by_era=by_era,
-                          by_country=by_country,
-                          by_condition=by_condition,
-                          by_folio=by_folio,
-                          top_valuable=top_valuable,
+                          by_pattern=snapshot['by_pattern'],
+                          by_era=snapshot['by_era'],
+                          by_country=snapshot['by_country'],
+                          by_condition=snapshot['by_condition'],
+                          by_folio=snapshot['by_folio'],
+                          top_valuable=snapshot['top_valuable'],
                           folios=book['folios'])
 
 # Dashboard Routes
@@ -390,250 +988,18 @@ def dashboard():
     return render_template('dashboard.html', folios=book['folios'])
 
 @app.route('/api/dashboard/stats')
+@conditional_json
 def dashboard_stats():
     """Return comprehensive stats for the dashboard"""
-    db = get_db()
-    
-    # Get total counts
-    total_balls = db.execute('SELECT COUNT(*) FROM golf_balls').fetchone()[0]
-    total_manufacturers = db.execute('SELECT COUNT(DISTINCT manufacturer) FROM golf_balls').fetchone()[0]
-    total_countries = db.execute('SELECT COUNT(DISTINCT country) FROM golf_balls WHERE country IS NOT NULL').fetchone()[0]
-    
-    # Most valuable ball
-    most_valuable_row = db.execute('''
-        SELECT ball_name, value_mid, folio, currency
-        FROM golf_balls
-        ORDER BY value_mid DESC
-        LIMIT 1
-    ''').fetchone()
-    most_valuable = {
-        "ball_name": most_valuable_row['ball_name'],
-        "value": most_valuable_row['value_mid'],
-        "folio": most_valuable_row['folio'],
-        "currency": most_valuable_row['currency']
-    }
-    
-    # By folio breakdown
-    folio_names = {
-        1: "Gutta-Percha",
-        2: "Rubber-Core",
-        3: "Wound Balls",
-        4: "Post-War"
-    }
-    folio_currencies = {
-        1: "USD",
-        2: "GBP",
-        3: "GBP",
-        4: "GBP"
-    }
-    
-    by_folio_rows = db.execute('''
-        SELECT folio, COUNT(*) as count, AVG(value_mid) as avg_value, 
-               MIN(value_mid) as min_value, MAX(value_mid) as max_value
-        FROM golf_balls
-        WHERE folio IS NOT NULL
-        GROUP BY folio
-        ORDER BY folio
-    ''').fetchall()
-    
-    by_folio = []
-    for row in by_folio_rows:
-        percentage = round((row['count'] / total_balls) * 100, 1) if total_balls > 0 else 0
-        by_folio.append({
-            "folio": row['folio'],
-            "name": folio_names.get(row['folio'], f"Folio {row['folio']}"),
-            "count": row['count'],
-            "avg_value": round(row['avg_value'], 2) if row['avg_value'] else 0,
-            "min_value": row['min_value'],
-            "max_value": row['max_value'],
-            "currency": folio_currencies.get(row['folio'], "GBP"),
-            "percentage": percentage
-        })
-    
-    # Timeline data (balls per year, grouped by folio)
-    timeline_rows = db.execute('''
-        SELECT era_start, folio, COUNT(*) as count
-        FROM golf_balls
-        WHERE era_start IS NOT NULL AND folio IS NOT NULL
-        GROUP BY era_start, folio
-        ORDER BY era_start
-    ''').fetchall()
-    
-    # Organize timeline data
-    timeline_dict = {}
-    for row in timeline_rows:
-        year = row['era_start']
-        folio = row['folio']
-        count = row['count']
-        if year not in timeline_dict:
-            timeline_dict[year] = {"year": year}
-        timeline_dict[year][f"folio_{folio}"] = count
-    
-    # Fill in zeros for missing folios
-    timeline = []
-    for year in sorted(timeline_dict.keys()):
-        entry = timeline_dict[year]
-        for folio_num in [1, 2, 3, 4]:
-            key = f"folio_{folio_num}"
-            if key not in entry:
-                entry[key] = 0
-        timeline.append(entry)
-    
-    # By country with flags
-    country_flags = {
-        "England": "🏴󠁧󠁢󠁥󠁮󠁧󠁿",
-        "USA": "🇺🇸",
-        "Scotland": "🏴󠁧󠁢󠁳󠁣󠁴󠁿",
-        "Ireland": "🇮🇪",
-        "Japan": "🇯🇵",
-        "Germany": "🇩🇪",
-        "Australia": "🇦🇺",
-        "Unknown": "🏳️"
-    }
-    
-    by_country_rows = db.execute('''
-        SELECT country, COUNT(*) as count
-        FROM golf_balls
-        WHERE country IS NOT NULL
-        GROUP BY country
-        ORDER BY count DESC
-    ''').fetchall()
-    
-    by_country = []
-    for row in by_country_rows:
-        by_country.append({
-            "country": row['country'],
-            "count": row['count'],
-            "flag": country_flags.get(row['country'], "🏳️")
-        })
-    
-    # Top 10 cover patterns
-    by_pattern_rows = db.execute('''
-        SELECT cover_pattern, COUNT(*) as count
-        FROM golf_balls
-        WHERE cover_pattern IS NOT NULL AND cover_pattern != ''
-        GROUP BY cover_pattern
-        ORDER BY count DESC
-        LIMIT 10
-    ''').fetchall()
-    
-    by_pattern = []
-    for row in by_pattern_rows:
-        by_pattern.append({
-            "pattern": row['cover_pattern'],
-            "count": row['count']
-        })
-    
-    # By value range (histogram buckets)
-    value_ranges = [
-        ("Under £100", 0, 100),
-        ("£100 - £500", 100, 500),
-        ("£500 - £1,000", 500, 1000),
-        ("£1,000 - £5,000", 1000, 5000),
-        ("Over £5,000", 5000, float('inf'))
-    ]
-    
-    by_value_range = []
-    for label, min_val, max_val in value_ranges:
-        if max_val == float('inf'):
-            count = db.execute('SELECT COUNT(*) FROM golf_balls WHERE value_mid >= ?', (min_val,)).fetchone()[0]
-        else:
-            count = db.execute('SELECT COUNT(*) FROM golf_balls WHERE value_mid >= ? AND value_mid < ?', (min_val, max_val)).fetchone()[0]
-        by_value_range.append({
-            "range": label,
-            "count": count
-        })
-    
-    # Top 10 manufacturers
-    top_manufacturers_rows = db.execute('''
-        SELECT manufacturer, COUNT(*) as count, country
-        FROM golf_balls
-        GROUP BY manufacturer
-        ORDER BY count DESC
-        LIMIT 10
-    ''').fetchall()
-    
-    top_manufacturers = []
-    for row in top_manufacturers_rows:
-        top_manufacturers.append({
-            "name": row['manufacturer'],
-            "count": row['count'],
-            "country": row['country'] if row['country'] else "Unknown"
-        })
-    
-    # Interesting facts
-    interesting_facts = []
-    
-    # Most valuable ball fact
-    interesting_facts.append(f"The most expensive ball is worth {most_valuable_row['currency']} {most_valuable_row['value_mid']:,.0f}")
-    
-    # Most common era/decade
-    decade_counts = db.execute('''
-        SELECT 
-            CASE 
-                WHEN era_start >= 1840 AND era_start < 1850 THEN '1840s'
-                WHEN era_start >= 1850 AND era_start < 1860 THEN '1850s'
-                WHEN era_start >= 1860 AND era_start < 1870 THEN '1860s'
-                WHEN era_start >= 1870 AND era_start < 1880 THEN '1870s'
-                WHEN era_start >= 1880 AND era_start < 1890 THEN '1880s'
-                WHEN era_start >= 1890 AND era_start < 1900 THEN '1890s'
-                WHEN era_start >= 1900 AND era_start < 1910 THEN '1900s'
-                WHEN era_start >= 1910 AND era_start < 1920 THEN '1910s'
-                WHEN era_start >= 1920 AND era_start < 1930 THEN '1920s'
-                WHEN era_start >= 1930 AND era_start < 1940 THEN '1930s'
-                WHEN era_start >= 1940 AND era_start < 1950 THEN '1940s'
-                ELSE 'Unknown'
-            END as decade,
-            COUNT(*) as count
-        FROM golf_balls 
-        WHERE era_start IS NOT NULL
-        GROUP BY decade
-        ORDER BY count DESC
-        LIMIT 1
-    ''').fetchone()
-    
-    if decade_counts:
-        interesting_facts.append(f"The {decade_counts['decade']} produced the most balls: {decade_counts['count']}")
-    
-    # Most common pattern
-    top_pattern = db.execute('''
-        SELECT cover_pattern, COUNT(*) as count
-        FROM golf_balls
-        WHERE cover_pattern IS NOT NULL AND cover_pattern != ''
-        GROUP BY cover_pattern
-        ORDER BY count DESC
-        LIMIT 1
-    ''').fetchone()
-    
-    if top_pattern:
-        interesting_facts.append(f"Most common cover pattern: {top_pattern['cover_pattern']} ({top_pattern['count']} balls)")
-    
-    # Country with most balls
-    top_country = db.execute('''
-        SELECT country, COUNT(*) as count
-        FROM golf_balls
-        WHERE country IS NOT NULL AND country != 'Unknown'
-        GROUP BY country
-        ORDER BY count DESC
-        LIMIT 1
-    ''').fetchone()
-    
-    if top_country:
-        interesting_facts.append(f"{top_country['country']} produced {top_country['count']} balls")
-    
-    return jsonify({
-        "total_balls": total_balls,
-        "total_manufacturers": total_manufacturers,
-        "total_countries": total_countries,
-        "most_valuable": most_valuable,
-        "by_folio": by_folio,
-        "timeline": timeline,
-        "by_country": by_country,
-        "by_pattern": by_pattern,
-        "by_value_range": by_value_range,
-        "top_manufacturers": top_manufacturers,
-        "interesting_facts": interesting_facts
-    })
+    compute = None
+    if dashboard_pool is not None:
+        compute = lambda: catalog_stats.concurrent_dashboard(catalog.connection, dashboard_pool)
+    return jsonify(catalog_stats.load(get_db(), 'dashboard', compute))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request and SQL metrics in the Prometheus text format"""
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # For local development
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Catalog Benchmark
+Times the main routes (through Flask's test client) and the import path
+against a catalog database - the real one, or a bigger one made with
+generate_catalog.py - and writes a JSON report that can be compared with
+one from another commit.
+
+    python benchmark.py --db catalog_100k.db -o before.json
+    ... change something ...
+    python benchmark.py --db catalog_100k.db --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+DEFAULT_DB = 'golf_balls_v2.db'
+REPEAT = 20
+IMPORT_REPEAT = 3
+IMPORT_ROWS = 10_000
+# Untimed runs first, so connections, statement caches and templates are warm
+WARMUP = 2
+
+# Timed imports parse rows laid out like this folio's sheet, and load them
+# as a folio no real sheet uses, so the load is all inserts
+SHEET_FOLIO = 4
+BENCH_FOLIO = 9
+
+# Changes in median smaller than this are reported as noise
+NOISE = 0.05
+
+
+def sample_values(db_path):
+    """Filter values and record numbers to benchmark with, picked from the
+    database so they exist at every size"""
+    conn = sqlite3.connect(db_path)
+    try:
+        def most_common(column):
+            return conn.execute(f"""
+                SELECT {column} FROM golf_balls WHERE {column} IS NOT NULL
+                GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT 1
+            """).fetchone()[0]
+        total, first, last = conn.execute(
+            'SELECT COUNT(*), MIN(record_no), MAX(record_no) FROM golf_balls').fetchone()
+        middle = conn.execute('SELECT record_no FROM golf_balls WHERE record_no >= ? LIMIT 1',
+                              ((first + last) // 2,)).fetchone()[0]
+        ids = [n for (n,) in conn.execute('SELECT record_no FROM golf_balls ORDER BY random() LIMIT 100')]
+        return {
+            'total': total,
+            'record_no': middle,
+            'ids': ids,
+            'word': most_common('manufacturer').split()[0].strip(',.').lower(),
+            'era': most_common('era'),
+            'pattern': most_common('cover_pattern'),
+            'country': most_common('country'),
+        }
+    finally:
+        conn.close()
+
+
+def search_url(**params):
+    return '/api/search?' + urlencode(params) if params else '/api/search'
+
+
+def route_cases(client, app, sample):
+    """(name, url) for every timed request"""
+    per_page = 20
+    last_page = max(1, (sample['total'] + per_page - 1) // per_page)
+    # A cursor for the same deep position as the last offset page
+    deep = client.get(search_url(page=last_page - 1)).get_json()['results'][-1]
+    cursor = app.encode_cursor('value_mid', 'DESC', deep['value_mid'], deep['record_no'])
+    return [
+        ('search: default', search_url()),
+        ('search: text', search_url(q=sample['word'])),
+        ('search: text + country, by value', search_url(q=sample['word'], country=sample['country'],
+                                                        sort='value_mid', order='DESC')),
+        ('search: era + pattern', search_url(era=sample['era'], pattern=sample['pattern'])),
+        ('search: value range, by name', search_url(min_value=100, max_value=500, sort='ball_name',
+                                                    order='ASC')),
+        ('search: facets', search_url(facets='folio,era,pattern,country')),
+        ('search: last page (offset)', search_url(page=last_page)),
+        ('search: last page (cursor)', search_url(cursor=cursor)),
+        ('dashboard stats', '/api/dashboard/stats'),
+        ('stats page', '/stats'),
+        ('browse page', '/browse'),
+        ('ball detail', f"/ball/{sample['record_no']}"),
+        ('ball api', f"/api/ball/{sample['record_no']}"),
+        ('ball batch (100 ids)', '/api/balls?ids=' + ','.join(map(str, sample['ids']))),
+    ]
+
+
+def timings(fn, repeat, warmup=WARMUP, setup=None):
+    """Seconds taken by each of `repeat` calls of fn(); setup() runs untimed
+    before every call"""
+    times = []
+    for i in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    return times
+
+
+def summarize(times):
+    ms = sorted(t * 1000 for t in times)
+    p95 = statistics.quantiles(ms, n=20)[18] if len(ms) > 1 else ms[0]
+    return {
+        'runs': len(ms),
+        'min_ms': round(ms[0], 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(p95, 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+    }
+
+
+def bench_routes(app, sample, repeat):
+    client = app.app.test_client()
+    results = {}
+    for name, url in route_cases(client, app, sample):
+        def request():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            response.get_data()
+        results[name] = summarize(timings(request, repeat))
+        print(f"  {name:<40} {results[name]['median_ms']:>10.2f} ms")
+    return results
+
+
+def raw_folio_frame(db_path, rows):
+    """Up to `rows` balls laid out like a SHEET_FOLIO sheet, as
+    pd.read_excel would return it"""
+    import pandas as pd
+    import import_folios
+
+    columns = {normalized: header for header, normalized in import_folios.COLUMN_MAPPINGS[SHEET_FOLIO].items()
+               if normalized != 'notes'}
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM golf_balls ORDER BY record_no LIMIT ?",
+                               conn, params=(rows,))
+    finally:
+        conn.close()
+    return df.rename(columns=columns)
+
+
+def bench_import(db_path, rows, repeat):
+    """Parse a sheet's worth of rows, load it into a copy of the database,
+    re-import it unchanged, and rebuild the stats snapshots"""
+    import import_folios
+    import catalog_stats
+
+    raw = raw_folio_frame(db_path, rows)
+    parsed = import_folios.clean_folio_frame(raw.copy(), SHEET_FOLIO)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, 'bench.db')
+        import_folios.DB_PATH = work
+
+        def fresh_copy():
+            shutil.copy(db_path, work)
+
+        def load():
+            import_folios.import_to_database(parsed, BENCH_FOLIO, rejects_dir=tmp)
+
+        cases = [
+            (f'import: parse {len(raw):,} rows',
+             lambda: import_folios.clean_folio_frame(raw.copy(), SHEET_FOLIO), None),
+            (f'import: load {len(parsed):,} new rows', load, fresh_copy),
+            (f'import: re-import {len(parsed):,} unchanged rows', load, None),
+            ('import: rebuild stats snapshots', lambda: catalog_stats.rebuild(work), None),
+        ]
+        fresh_copy()
+        for name, fn, setup in cases:
+            results[name] = summarize(timings(fn, repeat, warmup=1, setup=setup))
+            print(f"  {name:<40} {results[name]['median_ms']:>10.2f} ms")
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def compare(report, baseline):
+    """Print the median change of every case both reports have"""
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('rows'):,} rows)")
+    print(f"  {'case':<40} {'before':>10} {'after':>10} {'change':>8}")
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0
+        flag = '' if abs(change) < NOISE else (' slower' if change > 0 else ' faster')
+        print(f"  {name:<40} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} "
+              f"{change:>+7.0%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the catalog routes and import path')
+    parser.add_argument('--db', default=DEFAULT_DB, help='catalog database (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='report file (default: benchmark_<commit>_<rows>.json)')
+    parser.add_argument('--compare', metavar='REPORT', help='earlier report to compare against')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='timed runs per route (default: %(default)s)')
+    parser.add_argument('--import-repeat', type=int, default=IMPORT_REPEAT,
+                        help='timed runs per import step, 0 to skip them (default: %(default)s)')
+    parser.add_argument('--import-rows', type=int, default=IMPORT_ROWS,
+                        help='rows per timed import (default: %(default)s)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f'no such database: {args.db}')
+    # The app picks its database up at import time
+    os.environ['GOLF_DB_PATH'] = args.db
+    import app
+
+    sample = sample_values(args.db)
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'db': args.db,
+            'rows': sample['total'],
+            'in_memory': app.catalog.in_memory,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+
+    print(f"Benchmarking {args.db} ({sample['total']:,} rows) at {commit}")
+    print("Routes:")
+    report['results'].update(bench_routes(app, sample, args.repeat))
+    if args.import_repeat:
+        print("Import:")
+        report['results'].update(bench_import(args.db, args.import_rows, args.import_repeat))
+
+    output = args.output or f"benchmark_{commit or 'nogit'}_{sample['total']}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Golf Ball Catalog Connections
+Long-lived, read-only SQLite connections for the web tier.
+
+Each worker thread keeps one connection open for its lifetime instead of
+connecting per request, so the schema parse, the page cache and the
+prepared statements all carry over between requests.
+
+In memory mode the catalog file is copied into RAM once per worker and
+every thread queries its own in-memory copy, so requests do no disk I/O
+at all. The copy is swapped for a fresh one when the file on disk changes.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# Prepared statements kept per connection (sqlite3's per-connection LRU,
+# keyed by SQL text) - enough for every search shape the app generates
+STATEMENT_CACHE_SIZE = 512
+
+READ_PRAGMAS = [
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',  # 256 MB, comfortably the whole catalog
+    'PRAGMA cache_size = -65536',  # 64 MB page cache
+    'PRAGMA temp_store = MEMORY',
+]
+
+
+# A random non-negative 63-bit data version
+RANDOM_VERSION_SQL = 'random() & 9223372036854775807'
+
+
+def bump_data_version(db_path):
+    """Record that the catalog's data changed (imports, image uploads).
+
+    Cached API responses are tagged with this version, so bumping it
+    invalidates them in every worker. It is random rather than a counter:
+    a database file swapped in for another could have counted up to the
+    same number, but won't share its version.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(f"UPDATE catalog_meta SET value = {RANDOM_VERSION_SQL} WHERE key = 'data_version'")
+    finally:
+        conn.close()
+
+
+class CatalogDB:
+    """Hands out one read-only connection per thread for a database file"""
+
+    def __init__(self, path, in_memory=False, factory=sqlite3.Connection):
+        self.path = path
+        self.in_memory = in_memory
+        # Connection class for the per-thread connections
+        self.factory = factory
+        self._local = threading.local()
+        # Memory mode: (signature, serialized database, generation)
+        self._image = None
+        self._image_lock = threading.Lock()
+        # (signature, data version) as last read
+        self._version = None
+
+    def prepare(self):
+        """One-off setup on a writable connection, run at startup.
+
+        WAL is persistent in the file, and lets the importer commit while
+        workers keep reading.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+        finally:
+            conn.close()
+
+    def signature(self):
+        """Cheap fingerprint of the files on disk; changes whenever data is
+        committed (to the WAL or, after a checkpoint, the main file) or the
+        file is replaced"""
+        parts = []
+        for path in (self.path, f'{self.path}-wal'):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+            # An empty WAL (left behind by readers) holds nothing: same as none
+            if st is None or st.st_size == 0:
+                parts.append(None)
+            else:
+                parts.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(parts)
+
+    def data_version(self):
+        """The catalog's data version, read from the database only when the
+        files on disk have changed since it was last read"""
+        signature = self.signature()
+        cached = self._version
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        row = self.connection().execute(
+            "SELECT value FROM catalog_meta WHERE key = 'data_version'").fetchone()
+        version = row[0] if row else 0
+        self._version = (signature, version)
+        return version
+
+    def _file_identity(self):
+        st = os.stat(self.path)
+        return st.st_dev, st.st_ino
+
+    def _configure(self, conn):
+        conn.row_factory = sqlite3.Row
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _open(self, factory=sqlite3.Connection):
+        uri = f'{Path(self.path).absolute().as_uri()}?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE, factory=factory)
+        return self._configure(conn)
+
+    def connection(self):
+        """This thread's connection"""
+        if self.in_memory:
+            return self._memory_connection()
+        return self._file_connection()
+
+    def _file_connection(self):
+        # Reopened if the file has been replaced
+        identity = self._file_identity()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.identity != identity:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = self._local.conn = self._open(self.factory)
+            self._local.identity = identity
+        return conn
+
+    # Memory mode
+
+    def load_image(self):
+        """Copy the file into a serialized in-memory image, replacing the
+        current one if the file has changed since it was taken.
+
+        Called at worker start and whenever a connection notices the file
+        has changed. The image is swapped in only once it is complete, and
+        each thread moves its connection over on its next request, so no
+        query ever sees a half-loaded catalog.
+        """
+        with self._image_lock:
+            signature = self.signature()
+            if self._image is not None and self._image[0] == signature:
+                return self._image
+
+            source = self._open()
+            memory = sqlite3.connect(':memory:')
+            try:
+                source.backup(memory)
+                data = bytearray(memory.serialize())
+            finally:
+                memory.close()
+                source.close()
+            # Header bytes 18-19 are the file format versions, 2 for WAL; an
+            # in-memory copy must say rollback journal (1) or SQLite goes
+            # looking for a -wal file when it is deserialized
+            data[18:20] = b'\x01\x01'
+            data = bytes(data)
+
+            generation = self._image[2] + 1 if self._image else 1
+            self._image = (signature, data, generation)
+            return self._image
+
+    def _memory_connection(self):
+        image = self._image
+        if image is None or image[0] != self.signature():
+            image = self.load_image()
+        _, data, generation = image
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.generation != generation:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(':memory:', cached_statements=STATEMENT_CACHE_SIZE, factory=self.factory)
+            conn.deserialize(data)
+            conn = self._local.conn = self._configure(conn)
+            self._local.generation = generation
+        return conn
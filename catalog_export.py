@@ -0,0 +1,135 @@
+"""
+Golf Ball Catalog Export
+Streams query results out as CSV, NDJSON or Parquet, a batch of rows at a
+time, so memory use stays flat however many rows are exported.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+
+# Rows fetched from SQLite (and written out) at a time
+BATCH_SIZE = 500
+
+# Format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parquet_available():
+    return pa is not None
+
+
+def batches(cursor):
+    """Yield lists of rows from a cursor, BATCH_SIZE at a time"""
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def columns(cursor):
+    return [d[0] for d in cursor.description]
+
+
+def csv_chunks(cursor, column_types=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns(cursor))
+    for rows in batches(cursor):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty result
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(cursor, column_types=None):
+    names = columns(cursor)
+    for rows in batches(cursor):
+        yield ''.join(json.dumps(dict(zip(names, row))) + '\n' for row in rows).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the
+    last drain(), so Parquet can be streamed as it is produced"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# SQLite declared type -> Arrow type; anything else is exported as text
+ARROW_TYPES = {
+    'INTEGER': 'int64',
+    'REAL': 'float64',
+}
+
+
+def parquet_chunks(cursor, column_types):
+    """One row group per batch. column_types maps column name to its declared
+    SQLite type, so every row group gets the same schema even when a batch
+    holds only NULLs in some column."""
+    names = columns(cursor)
+    schema = pa.schema([(name, ARROW_TYPES.get(column_types.get(name, '').upper(), 'string'))
+                        for name in names])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches(cursor):
+            table = pa.Table.from_pylist([dict(zip(names, row)) for row in rows], schema=schema)
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+    'parquet': parquet_chunks,
+}
+
+
+def gzip_chunks(chunks):
+    """gzip-compress a stream of byte chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,452 @@
+"""
+Golf Ball Catalog Statistics
+Precomputed rollups behind /stats and /api/dashboard/stats.
+
+The catalog only changes when import_folios.py runs, so the aggregates are
+computed once, serialized into the catalog_stats table, and read back as a
+single row per page load.
+"""
+
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from catalog_db import CatalogDB
+
+# Bump when the shape of a snapshot changes so stale payloads get rebuilt
+SNAPSHOT_VERSION = 1
+
+# Facet name -> column for /api/search's per-value counts, in idx_facets
+# column order
+FACET_COLUMNS = {
+    'folio': 'folio',
+    'era': 'era',
+    'pattern': 'cover_pattern',
+    'country': 'country',
+    'condition': 'condition_grade',
+}
+
+# Threads that compute the dashboard aggregates at the same time, each on
+# its own read-only connection. SQLite releases the GIL while a query runs,
+# so a cold dashboard takes about as long as its slowest query rather than
+# all of them added up.
+QUERY_WORKERS = 4
+
+FOLIO_NAMES = {
+    1: "Gutta-Percha",
+    2: "Rubber-Core",
+    3: "Wound Balls",
+    4: "Post-War"
+}
+
+FOLIO_CURRENCIES = {
+    1: "USD",
+    2: "GBP",
+    3: "GBP",
+    4: "GBP"
+}
+
+COUNTRY_FLAGS = {
+    "England": "🏴󠁧󠁢󠁥󠁮󠁧󠁿",
+    "USA": "🇺🇸",
+    "Scotland": "🏴󠁧󠁢󠁳󠁣󠁴󠁿",
+    "Ireland": "🇮🇪",
+    "Japan": "🇯🇵",
+    "Germany": "🇩🇪",
+    "Australia": "🇦🇺",
+    "Unknown": "🏳️"
+}
+
+# (label, lower bound inclusive, upper bound exclusive or None)
+VALUE_RANGES = [
+    ("Under £100", 0, 100),
+    ("£100 - £500", 100, 500),
+    ("£500 - £1,000", 500, 1000),
+    ("£1,000 - £5,000", 1000, 5000),
+    ("Over £5,000", 5000, None)
+]
+
+
+def _rows(db, sql, params=()):
+    return [dict(row) for row in db.execute(sql, params).fetchall()]
+
+
+# Stats page
+
+def stats_page(db):
+    """Aggregates rendered by the /stats page"""
+    return {
+        'by_pattern': _rows(db, '''
+            SELECT cover_pattern, COUNT(*) as count, AVG(value_mid) as avg_value
+            FROM golf_balls
+            WHERE cover_pattern IS NOT NULL
+            GROUP BY cover_pattern
+            ORDER BY count DESC
+        '''),
+        'by_era': _rows(db, '''
+            SELECT era, COUNT(*) as count, AVG(value_mid) as avg_value
+            FROM golf_balls
+            WHERE era IS NOT NULL
+            GROUP BY era
+            ORDER BY era_sort
+        '''),
+        'by_country': _rows(db, '''
+            SELECT country, COUNT(*) as count, AVG(value_mid) as avg_value
+            FROM golf_balls
+            WHERE country IS NOT NULL
+            GROUP BY country
+            ORDER BY count DESC
+        '''),
+        'by_condition': _rows(db, '''
+            SELECT condition_grade, COUNT(*) as count, AVG(value_mid) as avg_value
+            FROM golf_balls
+            WHERE condition_grade IS NOT NULL
+            GROUP BY condition_grade
+            ORDER BY condition_grade
+        '''),
+        # Folio breakdown
+        'by_folio': _rows(db, '''
+            SELECT folio, COUNT(*) as count, AVG(value_mid) as avg_value, currency
+            FROM golf_balls
+            WHERE folio IS NOT NULL
+            GROUP BY folio
+            ORDER BY folio
+        '''),
+        'top_valuable': _rows(db, '''
+            SELECT record_no, ball_name, era, value_mid, manufacturer, condition_grade, folio, currency
+            FROM golf_balls
+            ORDER BY value_mid DESC
+            LIMIT 20
+        '''),
+    }
+
+
+# Dashboard - each query is independent; assemble_dashboard shapes the JSON
+
+def _query_totals(db):
+    row = db.execute('''
+        SELECT COUNT(*) as total_balls,
+               COUNT(DISTINCT manufacturer) as total_manufacturers,
+               COUNT(DISTINCT country) as total_countries
+        FROM golf_balls
+    ''').fetchone()
+    return dict(row)
+
+
+def _query_most_valuable(db):
+    return _rows(db, '''
+        SELECT ball_name, value_mid, folio, currency
+        FROM golf_balls
+        ORDER BY value_mid DESC
+        LIMIT 1
+    ''')
+
+
+def _query_by_folio(db):
+    return _rows(db, '''
+        SELECT folio, COUNT(*) as count, AVG(value_mid) as avg_value,
+               MIN(value_mid) as min_value, MAX(value_mid) as max_value
+        FROM golf_balls
+        WHERE folio IS NOT NULL
+        GROUP BY folio
+        ORDER BY folio
+    ''')
+
+
+def _query_timeline(db):
+    # Balls per year, grouped by folio
+    return _rows(db, '''
+        SELECT era_start, folio, COUNT(*) as count
+        FROM golf_balls
+        WHERE era_start IS NOT NULL AND folio IS NOT NULL
+        GROUP BY era_start, folio
+        ORDER BY era_start
+    ''')
+
+
+def _query_by_country(db):
+    return _rows(db, '''
+        SELECT country, COUNT(*) as count
+        FROM golf_balls
+        WHERE country IS NOT NULL
+        GROUP BY country
+        ORDER BY count DESC
+    ''')
+
+
+def _query_by_pattern(db):
+    return _rows(db, '''
+        SELECT cover_pattern, COUNT(*) as count
+        FROM golf_balls
+        WHERE cover_pattern IS NOT NULL AND cover_pattern != ''
+        GROUP BY cover_pattern
+        ORDER BY count DESC
+        LIMIT 10
+    ''')
+
+
+def _query_value_ranges(db):
+    # Every histogram bucket in one pass
+    buckets = []
+    params = []
+    for _, low, high in VALUE_RANGES:
+        if high is None:
+            buckets.append('COUNT(CASE WHEN value_mid >= ? THEN 1 END)')
+            params.append(low)
+        else:
+            buckets.append('COUNT(CASE WHEN value_mid >= ? AND value_mid < ? THEN 1 END)')
+            params.extend([low, high])
+    return list(db.execute(f"SELECT {', '.join(buckets)} FROM golf_balls", params).fetchone())
+
+
+def _query_top_manufacturers(db):
+    return _rows(db, '''
+        SELECT manufacturer, COUNT(*) as count, country
+        FROM golf_balls
+        GROUP BY manufacturer
+        ORDER BY count DESC
+        LIMIT 10
+    ''')
+
+
+def _query_top_decade(db):
+    return _rows(db, '''
+        SELECT
+            CASE
+                WHEN era_start >= 1840 AND era_start < 1850 THEN '1840s'
+                WHEN era_start >= 1850 AND era_start < 1860 THEN '1850s'
+                WHEN era_start >= 1860 AND era_start < 1870 THEN '1860s'
+                WHEN era_start >= 1870 AND era_start < 1880 THEN '1870s'
+                WHEN era_start >= 1880 AND era_start < 1890 THEN '1880s'
+                WHEN era_start >= 1890 AND era_start < 1900 THEN '1890s'
+                WHEN era_start >= 1900 AND era_start < 1910 THEN '1900s'
+                WHEN era_start >= 1910 AND era_start < 1920 THEN '1910s'
+                WHEN era_start >= 1920 AND era_start < 1930 THEN '1920s'
+                WHEN era_start >= 1930 AND era_start < 1940 THEN '1930s'
+                WHEN era_start >= 1940 AND era_start < 1950 THEN '1940s'
+                ELSE 'Unknown'
+            END as decade,
+            COUNT(*) as count
+        FROM golf_balls
+        WHERE era_start IS NOT NULL
+        GROUP BY decade
+        ORDER BY count DESC
+        LIMIT 1
+    ''')
+
+
+DASHBOARD_QUERIES = {
+    'totals': _query_totals,
+    'most_valuable': _query_most_valuable,
+    'by_folio': _query_by_folio,
+    'timeline': _query_timeline,
+    'by_country': _query_by_country,
+    'by_pattern': _query_by_pattern,
+    'value_ranges': _query_value_ranges,
+    'top_manufacturers': _query_top_manufacturers,
+    'top_decade': _query_top_decade,
+}
+
+
+def assemble_dashboard(results):
+    """Build the /api/dashboard/stats payload from DASHBOARD_QUERIES results"""
+    totals = results['totals']
+    total_balls = totals['total_balls']
+
+    # Most valuable ball
+    most_valuable_row = results['most_valuable'][0]
+    most_valuable = {
+        "ball_name": most_valuable_row['ball_name'],
+        "value": most_valuable_row['value_mid'],
+        "folio": most_valuable_row['folio'],
+        "currency": most_valuable_row['currency']
+    }
+
+    # By folio breakdown
+    by_folio = []
+    for row in results['by_folio']:
+        percentage = round((row['count'] / total_balls) * 100, 1) if total_balls > 0 else 0
+        by_folio.append({
+            "folio": row['folio'],
+            "name": FOLIO_NAMES.get(row['folio'], f"Folio {row['folio']}"),
+            "count": row['count'],
+            "avg_value": round(row['avg_value'], 2) if row['avg_value'] else 0,
+            "min_value": row['min_value'],
+            "max_value": row['max_value'],
+            "currency": FOLIO_CURRENCIES.get(row['folio'], "GBP"),
+            "percentage": percentage
+        })
+
+    # Organize timeline data
+    timeline_dict = {}
+    for row in results['timeline']:
+        year = row['era_start']
+        if year not in timeline_dict:
+            timeline_dict[year] = {"year": year}
+        timeline_dict[year][f"folio_{row['folio']}"] = row['count']
+
+    # Fill in zeros for missing folios
+    timeline = []
+    for year in sorted(timeline_dict.keys()):
+        entry = timeline_dict[year]
+        for folio_num in [1, 2, 3, 4]:
+            entry.setdefault(f"folio_{folio_num}", 0)
+        timeline.append(entry)
+
+    # By country with flags
+    by_country = [{
+        "country": row['country'],
+        "count": row['count'],
+        "flag": COUNTRY_FLAGS.get(row['country'], "🏳️")
+    } for row in results['by_country']]
+
+    # Top 10 cover patterns
+    by_pattern = [{
+        "pattern": row['cover_pattern'],
+        "count": row['count']
+    } for row in results['by_pattern']]
+
+    # By value range (histogram buckets)
+    by_value_range = [{
+        "range": label,
+        "count": count
+    } for (label, _, _), count in zip(VALUE_RANGES, results['value_ranges'])]
+
+    # Top 10 manufacturers
+    top_manufacturers = [{
+        "name": row['manufacturer'],
+        "count": row['count'],
+        "country": row['country'] if row['country'] else "Unknown"
+    } for row in results['top_manufacturers']]
+
+    # Interesting facts
+    interesting_facts = [
+        f"The most expensive ball is worth {most_valuable_row['currency']} {most_valuable_row['value_mid']:,.0f}"
+    ]
+
+    # Most common era/decade
+    if results['top_decade']:
+        decade = results['top_decade'][0]
+        interesting_facts.append(f"The {decade['decade']} produced the most balls: {decade['count']}")
+
+    # Most common pattern - the head of the pattern ranking
+    if results['by_pattern']:
+        top_pattern = results['by_pattern'][0]
+        interesting_facts.append(f"Most common cover pattern: {top_pattern['cover_pattern']} ({top_pattern['count']} balls)")
+
+    # Country with most balls, leaving out the Unknown bucket
+    top_country = next((row for row in results['by_country'] if row['country'] != 'Unknown'), None)
+    if top_country:
+        interesting_facts.append(f"{top_country['country']} produced {top_country['count']} balls")
+
+    return {
+        "total_balls": total_balls,
+        "total_manufacturers": totals['total_manufacturers'],
+        "total_countries": totals['total_countries'],
+        "most_valuable": most_valuable,
+        "by_folio": by_folio,
+        "timeline": timeline,
+        "by_country": by_country,
+        "by_pattern": by_pattern,
+        "by_value_range": by_value_range,
+        "top_manufacturers": top_manufacturers,
+        "interesting_facts": interesting_facts
+    }
+
+
+def run_queries(queries, connect, executor=None):
+    """Run named query functions, each on the connection connect() returns.
+
+    With an executor they run concurrently and connect() is called on the
+    pool's threads, so it must hand out one connection per thread, like
+    CatalogDB.connection does.
+    """
+    if executor is None:
+        db = connect()
+        return {name: query(db) for name, query in queries.items()}
+    futures = {name: executor.submit(lambda query=query: query(connect()))
+               for name, query in queries.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def dashboard(db):
+    """Aggregates served by /api/dashboard/stats"""
+    return assemble_dashboard(run_queries(DASHBOARD_QUERIES, lambda: db))
+
+
+def concurrent_dashboard(connect, executor):
+    """dashboard(), with its queries run at the same time on executor"""
+    return assemble_dashboard(run_queries(DASHBOARD_QUERIES, connect, executor))
+
+
+# Search facets
+
+def facet_values(db):
+    """Ball count per value of each facet, as /api/search reports them when
+    nothing is filtered"""
+    return {name: _rows(db, f'''
+                SELECT {column} AS value, COUNT(*) AS count FROM golf_balls
+                WHERE {column} IS NOT NULL
+                GROUP BY {column}
+                ORDER BY count DESC, CAST({column} AS TEXT)
+            ''')
+            for name, column in FACET_COLUMNS.items()}
+
+
+SNAPSHOTS = {
+    'stats_page': stats_page,
+    'dashboard': dashboard,
+    'facets': facet_values,
+}
+
+
+def rebuild(db_path, names=None, workers=QUERY_WORKERS):
+    """Recompute snapshots (all by default) and store them in one transaction.
+    With workers > 1 the dashboard's queries run concurrently."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        payloads = {}
+        for name in names or SNAPSHOTS:
+            if name == 'dashboard' and workers > 1:
+                with ThreadPoolExecutor(workers, thread_name_prefix='stats') as pool:
+                    snapshot = concurrent_dashboard(CatalogDB(db_path).connection, pool)
+            else:
+                snapshot = SNAPSHOTS[name](conn)
+            payloads[name] = json.dumps(snapshot, separators=(',', ':'))
+
+        built_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with conn:
+            for name, payload in payloads.items():
+                conn.execute('''
+                    INSERT OR REPLACE INTO catalog_stats (name, version, payload, built_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (name, SNAPSHOT_VERSION, payload, built_at))
+    finally:
+        conn.close()
+
+
+def ensure(db_path, workers=QUERY_WORKERS):
+    """Build any snapshot that is missing or was written by an older version"""
+    conn = sqlite3.connect(db_path)
+    try:
+        current = {name for (name,) in conn.execute(
+            'SELECT name FROM catalog_stats WHERE version = ?', (SNAPSHOT_VERSION,))}
+    finally:
+        conn.close()
+    stale = [name for name in SNAPSHOTS if name not in current]
+    if stale:
+        rebuild(db_path, stale, workers)
+
+
+def load(db, name, compute=None):
+    """Return a stored snapshot, computing it live - with compute() if given -
+    if it has not been built"""
+    row = db.execute('SELECT payload FROM catalog_stats WHERE name = ? AND version = ?',
+                     (name, SNAPSHOT_VERSION)).fetchone()
+    if row is not None:
+        return json.loads(row[0])
+    if compute is not None:
+        return compute()
+    return SNAPSHOTS[name](db)
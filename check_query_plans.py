@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs EXPLAIN QUERY PLAN on every query shape /api/search and /browse can
+generate, and exits non-zero if any of them falls back to a full table scan
+or runs the full-text search once per row of another loop
+"""
+
+import itertools
+import re
+import sqlite3
+import sys
+
+import app
+import slow_queries
+
+# One representative value per filter - only the shape matters to the planner
+SAMPLE_FILTERS = {
+    'q': 'forgan',
+    'folio': '2',
+    'era': 'Mid 1890s',
+    'pattern': 'Mesh',
+    'country': 'Scotland',
+    'condition': 'A2',
+    'min_value': '100',
+    'max_value': '500',
+    'has_image': '1',
+}
+
+# Sample "last row" sort keys for the keyset variants of each shape
+SAMPLE_SORT_VALUES = {
+    'relevance': -1.0,
+    'value_mid': 100.0,
+    'ball_name': 'M',
+    'era_sort': 1890,
+    'record_no': 100,
+    'condition_grade': 'A2',
+}
+
+# A plain SCAN of the table (no index named) visits every row
+TABLE_SCAN_RE = re.compile(r'^SCAN (b|golf_balls)$')
+
+
+def search_shapes():
+    """Yield (label, sql, params, filtered) for every search query shape"""
+    for size in range(len(SAMPLE_FILTERS) + 1):
+        for keys in itertools.combinations(SAMPLE_FILTERS, size):
+            sq = app.build_search_query({key: SAMPLE_FILTERS[key] for key in keys})
+            yield f"filters={','.join(keys) or '-'} [facets]", app.facet_sql(sq), list(sq['params']), bool(keys)
+
+            for sort in app.VALID_SORTS + ['relevance']:
+                if sort == 'relevance' and 'q' not in keys:
+                    continue
+                for order in ('ASC', 'DESC'):
+                    args = {key: SAMPLE_FILTERS[key] for key in keys}
+                    args.update(sort=sort, order=order)
+                    sq = app.build_search_query(args)
+                    label = f"filters={','.join(keys) or '-'} sort={sq['sort']} {sq['order']}"
+                    params = list(sq['params'])
+
+                    yield f'{label} [count]', app.search_count_sql(sq), params, bool(keys)
+                    yield f'{label} [page]', app.search_page_sql(sq), params + [20, 0], bool(keys)
+                    for sort_value in (SAMPLE_SORT_VALUES[sq['sort']], None):
+                        segments = app.keyset_segments(sq['sort_expr'], sq['order'], sort_value, 100)
+                        for keyset, keyset_params in segments:
+                            yield (f'{label} [keyset {sort_value!r}: {keyset}]', app.search_page_sql(sq, keyset),
+                                   params + keyset_params + [21, 0], True)
+
+
+def browse_shapes():
+    """Yield (label, sql, params, filtered) for the /browse option lists"""
+    for name, sql in app.BROWSE_OPTION_QUERIES.items():
+        yield f'browse {name}', sql, [], True
+
+
+def full_scan(plan, filtered):
+    """True when the plan reads every row of golf_balls.
+
+    Unfiltered listings may walk the table in the requested order and stop at
+    LIMIT; anything that filters, or has to sort the whole table, may not.
+    """
+    scans = any(TABLE_SCAN_RE.match(detail.strip()) for detail in plan)
+    sorts = any('TEMP B-TREE' in detail for detail in plan)
+    return scans and (filtered or sorts)
+
+
+def fts_per_row(plan):
+    """True when the plan runs the FTS match again for every row of an
+    outer loop, e.g. starting from a filter's index"""
+    return bool(slow_queries.per_row_virtual_scans(plan))
+
+
+def main():
+    db = sqlite3.connect(app.DATABASE)
+    checked = 0
+    failures = []
+
+    for label, sql, params, filtered in itertools.chain(search_shapes(), browse_shapes()):
+        plan = slow_queries.explain(db, sql, params)
+        checked += 1
+        if full_scan(plan, filtered):
+            failures.append(('FULL SCAN', label, sql, plan))
+        elif fts_per_row(plan):
+            failures.append(('FTS PER ROW', label, sql, plan))
+
+    db.close()
+
+    for problem, label, sql, plan in failures:
+        print(f"{problem}: {label}")
+        print(f"  {' '.join(sql.split())}")
+        for detail in plan:
+            print(f"    {detail}")
+
+    scans = sum(1 for problem, *_ in failures if problem == 'FULL SCAN')
+    print(f"\nChecked {checked} query shapes, {scans} full table scans, "
+          f"{len(failures) - scans} per-row full-text searches")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Golf Ball Fuzzy Search
+A typo-tolerant index over ball names and makers, so "Forgen" still finds
+the Forgan balls that the full-text search misses.
+
+Every distinct word of ball_name, ball_name_format and manufacturer is
+split into trigrams the way PostgreSQL's pg_trgm does it: lower-cased,
+accents dropped, padded with two spaces in front and one behind. A search
+term is compared only with the words that share a trigram with it. Their
+similarity is the trigrams they share over all the trigrams of the two,
+and words at SIMILARITY_THRESHOLD or above count as matches. The term
+still being typed (the last one, with no space after it yet) also
+matches every word it begins, so results follow each keystroke.
+
+A ball matches when every term matches a word in one of those columns.
+A match counts for less outside the name (COLUMN_WEIGHTS), and a ball's
+score is the mean of each term's best weighted similarity.
+
+The index is held in memory and built with one GROUP BY per column, so
+each distinct text is split only once; the app rebuilds it when the
+catalog's data version changes.
+"""
+
+import heapq
+import re
+import unicodedata
+from collections import Counter
+
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+
+# Indexed columns and what a match in each is worth; ball_name_format
+# describes the stamp, and often names other balls
+COLUMN_WEIGHTS = {
+    'ball_name': 1.0,
+    'manufacturer': 0.8,
+    'ball_name_format': 0.6,
+}
+
+WORD_RE = re.compile(r'\w+')
+# The accents NFKD splits off Latin letters
+COMBINING_RE = re.compile('[\u0300-\u036f]')
+
+
+def fold(text):
+    """Lower-case text with its accents removed"""
+    if text.isascii():
+        return text.lower()
+    return COMBINING_RE.sub('', unicodedata.normalize('NFKD', text.lower()))
+
+
+def words(text):
+    return WORD_RE.findall(fold(text)) if text else []
+
+
+def trigrams(word, prefix=False):
+    """The word's trigrams; a prefix has no padding at its end, since the
+    word it begins goes on"""
+    padded = f'  {word}' if prefix else f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Trigram index over the words of every ball's names and maker"""
+
+    def __init__(self, texts):
+        """texts: (column, text, record_nos of the balls it appears in)"""
+        balls = {}
+        for column, text, record_nos in texts:
+            for word in set(words(text)):
+                balls.setdefault(word, {}).setdefault(column, []).extend(record_nos)
+        self.words = list(balls)
+        # Per word: (column weight, the balls it appears in there) for each
+        # column it's in, and its trigram count
+        self.balls = [[(COLUMN_WEIGHTS[column], tuple(record_nos))
+                       for column, record_nos in balls[word].items()] for word in self.words]
+        self.sizes = []
+        self.postings = {}
+        for word_id, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(word_id)
+
+    @classmethod
+    def load(cls, db):
+        """Index the catalog; each distinct text is read and split once"""
+        def texts():
+            for column in COLUMN_WEIGHTS:
+                for text, record_nos in db.execute(f"""
+                    SELECT {column}, group_concat(record_no) FROM golf_balls
+                    WHERE {column} IS NOT NULL GROUP BY {column}
+                """):
+                    yield column, text, [int(n) for n in record_nos.split(',')]
+        return cls(texts())
+
+    def similar_words(self, term, prefix=False):
+        """{word id: similarity} for the words at or above the threshold"""
+        grams = trigrams(term, prefix)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        matches = {}
+        for word_id, n in shared.items():
+            if prefix and self.words[word_id].startswith(term):
+                matches[word_id] = 1.0
+                continue
+            similarity = n / (len(grams) + self.sizes[word_id] - n)
+            if similarity >= SIMILARITY_THRESHOLD:
+                matches[word_id] = similarity
+        return matches
+
+    def term_scores(self, term, prefix=False):
+        """{record_no: best weighted similarity of any of its words to term}"""
+        matches = [(weight * similarity, record_nos)
+                   for word_id, similarity in self.similar_words(term, prefix).items()
+                   for weight, record_nos in self.balls[word_id]]
+        scores = {}
+        # Weakest first, so a ball ends up with its best match's score
+        for score, record_nos in sorted(matches, key=lambda m: m[0]):
+            scores.update(dict.fromkeys(record_nos, score))
+        return scores
+
+    def search(self, text, limit=10):
+        """(total matches, [(record_no, score), ...] best first).
+
+        Equal scores come in record_no order.
+        """
+        terms = words(text)
+        if not terms:
+            return 0, []
+        typing = not text[-1].isspace()
+        per_term = [self.term_scores(term, typing and i == len(terms) - 1)
+                    for i, term in enumerate(terms)]
+        # Intersect starting from the term with the fewest matches
+        per_term.sort(key=len)
+        totals = per_term[0]
+        for scores in per_term[1:]:
+            totals = {record_no: total + scores[record_no]
+                      for record_no, total in totals.items() if record_no in scores}
+        best = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], item[0]))
+        return len(totals), [(record_no, round(total / len(terms), 3)) for record_no, total in best]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Synthetic Catalog Generator
+Builds golf_balls databases of any size whose columns follow the real
+catalog's distributions, so performance work can be judged at 10k, 100k or
+1M rows rather than only against the 4,400 real balls.
+
+Every column is drawn from the real data: eras, patterns, makers and
+values with their real frequencies, and the free-text columns with their
+real lengths, built from the real vocabulary. Columns that belong
+together (an era and its parsed years, a maker and its country, a value
+and its currency) are drawn as one unit so they stay consistent. The
+output has the full current schema, search index and stats snapshots.
+
+    python generate_catalog.py 100k                # -> catalog_100k.db
+    python generate_catalog.py 250000 -o big.db --seed 7
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+import numpy as np
+
+import schema
+import catalog_stats
+
+SOURCE_DB = 'golf_balls_v2.db'
+
+# Named sizes; any other row count can be given as a number
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# Rows generated and inserted at a time
+BATCH_ROWS = 50_000
+
+# Columns drawn together from one real ball
+COLUMN_GROUPS = [
+    ['era', 'era_start', 'era_end', 'era_sort'],
+    ['manufacturer', 'country'],
+    ['folio', 'value_raw', 'value_low', 'value_high', 'value_mid', 'currency'],
+    ['cover_pattern'],
+    ['condition_grade'],
+    ['rarity_score'],
+]
+
+# Free text, generated word by word
+TEXT_COLUMNS = ['ball_name', 'ball_name_format', 'specs', 'patents_legal', 'auction_remarks']
+
+WORD_RE = re.compile(r'\S+')
+
+
+def parse_size(value):
+    size = SIZES.get(value.lower())
+    if size is None:
+        try:
+            size = int(value.replace('_', ''))
+        except ValueError:
+            raise ValueError(f'not a size: {value}')
+    if size < 1:
+        raise ValueError('size must be positive')
+    return size
+
+
+class CatalogModel:
+    """The real catalog's distributions, read once from the source database"""
+
+    def __init__(self, source_db):
+        conn = sqlite3.connect(source_db)
+        try:
+            self.table_sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'golf_balls'").fetchone()[0]
+            self.index_sql = [sql for (sql,) in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'golf_balls' "
+                "AND sql IS NOT NULL")]
+            # Each group's distinct value tuples and how often each occurs
+            self.groups = []
+            for columns in COLUMN_GROUPS:
+                rows = conn.execute(f"""
+                    SELECT {', '.join(columns)}, COUNT(*) FROM golf_balls
+                    GROUP BY {', '.join(columns)}
+                """).fetchall()
+                self.groups.append((columns, [row[:-1] for row in rows], _weights([row[-1] for row in rows])))
+            # Each text column's vocabulary, and its real word counts (None for NULL)
+            self.texts = {}
+            for column in TEXT_COLUMNS:
+                values = [value for (value,) in conn.execute(f'SELECT {column} FROM golf_balls')]
+                counts = {}
+                lengths = []
+                for value in values:
+                    if value is None:
+                        lengths.append(-1)
+                        continue
+                    words = WORD_RE.findall(value)
+                    lengths.append(len(words))
+                    for word in words:
+                        counts[word] = counts.get(word, 0) + 1
+                vocabulary = list(counts)
+                self.texts[column] = (vocabulary, _weights([counts[w] for w in vocabulary]), np.array(lengths))
+        finally:
+            conn.close()
+
+    def columns(self):
+        return ['record_no'] + [c for columns, _, _ in self.groups for c in columns] + TEXT_COLUMNS
+
+    def rows(self, rng, first_record_no, count):
+        """count generated rows, as tuples in columns() order"""
+        data = [range(first_record_no, first_record_no + count)]
+        for columns, values, weights in self.groups:
+            picks = rng.choice(len(values), size=count, p=weights)
+            chosen = [values[i] for i in picks]
+            data.extend(zip(*chosen) if len(columns) > 1 else [[v[0] for v in chosen]])
+        for column in TEXT_COLUMNS:
+            data.append(self._text(rng, column, count))
+        return list(zip(*data))
+
+    def _text(self, rng, column, count):
+        vocabulary, weights, lengths = self.texts[column]
+        sizes = rng.choice(lengths, size=count)
+        words = rng.choice(len(vocabulary), size=int(sizes.clip(0).sum()), p=weights) if vocabulary else []
+        texts = []
+        position = 0
+        for size in sizes:
+            if size < 0:
+                texts.append(None)
+                continue
+            texts.append(' '.join(vocabulary[i] for i in words[position:position + size]))
+            position += size
+        # ball_name is NOT NULL
+        if column == 'ball_name':
+            texts = [text or 'UNNAMED' for text in texts]
+        return texts
+
+
+def _weights(counts):
+    counts = np.array(counts, dtype=float)
+    return counts / counts.sum()
+
+
+def generate(output, size, seed=0, source_db=SOURCE_DB):
+    """Write a size-row synthetic catalog to output, replacing any file there"""
+    model = CatalogModel(source_db)
+    rng = np.random.default_rng(seed)
+    for path in (output, output + '-wal', output + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    columns = model.columns()
+    conn = sqlite3.connect(output)
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute(model.table_sql)
+        with conn:
+            for start in range(0, size, BATCH_ROWS):
+                count = min(BATCH_ROWS, size - start)
+                conn.executemany(
+                    f"INSERT INTO golf_balls ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    model.rows(rng, start + 1, count))
+                print(f"  {start + count:,} / {size:,} rows", end='\r', flush=True)
+        print()
+        # Indexes after the data, in one pass each
+        for sql in model.index_sql:
+            conn.execute(sql)
+    finally:
+        conn.close()
+
+    # Everything else the app expects: search index, newer indexes, stats
+    print("Migrating schema and building stats snapshots...")
+    schema.migrate(output)
+    catalog_stats.rebuild(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic golf_balls database')
+    parser.add_argument('size', help=f"row count, or one of {', '.join(SIZES)}")
+    parser.add_argument('-o', '--output', help='database to write (default: catalog_<size>.db)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: %(default)s)')
+    parser.add_argument('--source', default=SOURCE_DB, help='real catalog to model (default: %(default)s)')
+    args = parser.parse_args()
+    try:
+        size = parse_size(args.size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = args.output or f'catalog_{args.size.lower()}.db'
+    print(f"Generating {size:,} balls modelled on {args.source} -> {output}")
+    generate(output, size, args.seed, args.source)
+    print("Done")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
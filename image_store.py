@@ -0,0 +1,240 @@
+"""
+Golf Ball Image Store
+Content-addressed storage for uploaded photos.
+
+Every upload is stored once, under the SHA-256 of its bytes:
+
+    static/uploads/objects/<first two hex digits>/<sha256>.<ext>
+
+so uploading the same photo again (to the same ball or another one) costs
+no extra disk space, and a stored file never changes - it can be cached
+forever. Which balls show which photos, along with each photo's size,
+dimensions and resized variants, is recorded in the ball_images table.
+
+Files are written to a temp file and renamed into place, so a reader never
+sees a partial upload and concurrent uploads can't overwrite each other.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+import image_variants
+from catalog_db import bump_data_version
+
+OBJECTS_DIR = 'objects'
+# Uploads are written here before being moved into OBJECTS_DIR; a sibling,
+# so no /uploads/objects/ URL reaches a half-written file
+TMP_DIR = 'tmp'
+CHUNK_SIZE = 64 * 1024
+
+# mkstemp creates files readable by their owner only; stored files get the
+# mode any new file would. Reading the umask means setting it, so it's done
+# once here, before any threads start.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+# Stored files never change, so browsers and CDNs may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def object_name(digest, ext):
+    return f'{digest}.{ext}'
+
+
+def object_folder(upload_folder, digest):
+    return os.path.join(upload_folder, OBJECTS_DIR, digest[:2])
+
+
+def object_url(digest, ext):
+    return f'/uploads/{OBJECTS_DIR}/{digest[:2]}/{object_name(digest, ext)}'
+
+
+def store(upload_folder, stream, ext):
+    """Copy a file-like object into the store.
+
+    Returns (digest, created) - created is False when identical bytes were
+    already stored, in which case nothing new is kept on disk.
+    """
+    tmp_folder = os.path.join(upload_folder, TMP_DIR)
+    os.makedirs(tmp_folder, exist_ok=True)
+
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(tmp_path, FILE_MODE)
+
+        digest = sha.hexdigest()
+        folder = object_folder(upload_folder, digest)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, object_name(digest, ext))
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            return digest, False
+        # Atomic; if an identical upload wins the race it wrote the same bytes
+        os.replace(tmp_path, path)
+        return digest, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def add_image(db_path, upload_folder, record_no, stream, original_name, uploaded_at=None):
+    """Store an uploaded file, resize it and attach it to a ball.
+
+    The first image a ball gets becomes its primary one. Returns a dict with
+    the stored name and hash, and whether the bytes (duplicate) or the
+    ball/image pair (linked) were already known.
+    """
+    ext = original_name.rsplit('.', 1)[1].lower()
+    digest, created = store(upload_folder, stream, ext)
+    folder = object_folder(upload_folder, digest)
+    filename = object_name(digest, ext)
+    path = os.path.join(folder, filename)
+    try:
+        # Identical bytes were stored before; their variants may still be
+        # being written, so link_image takes the list from the upload that
+        # stored them
+        if created:
+            variants = image_variants.generate_variants(folder, filename)
+        else:
+            variants = image_variants.existing_variants(folder, filename)
+        width, height = image_variants.image_size(path)
+
+        linked = link_image(db_path, record_no, digest, ext, original_name, {
+            'size_bytes': os.path.getsize(path),
+            'width': width,
+            'height': height,
+            'variants': json.dumps(variants),
+            'uploaded_at': uploaded_at,
+        }, created)
+    except BaseException:
+        # Don't leave behind a file no ball shows
+        if created:
+            discard(db_path, upload_folder, digest, ext)
+        raise
+    return {'sha256': digest, 'ext': ext, 'filename': filename,
+            'duplicate': not created, 'linked': linked}
+
+
+def link_image(db_path, record_no, digest, ext, original_name, meta, created=False):
+    """Attach a stored file to a ball. Returns False if it already was.
+
+    Only the upload that stored the file (created) knows its variants are
+    all written, so it records its list on every row of the file. Any
+    other upload copies the list from a row already there, and its own
+    guess is kept only until the storing upload links.
+
+    The web tier's connections are read-only, so this opens its own.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            # One statement, so the primary check and the insert happen
+            # under the same write lock
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO ball_images
+                    (record_no, sha256, ext, original_name, uploaded_at,
+                     size_bytes, width, height, variants, is_primary)
+                SELECT ?, ?, ?, ?, COALESCE(?, datetime('now')), ?, ?, ?,
+                       COALESCE((SELECT variants FROM ball_images
+                                 WHERE sha256 = ? AND ext = ? AND NOT ?), ?),
+                       NOT EXISTS (SELECT 1 FROM ball_images WHERE record_no = ?)
+            """, (record_no, digest, ext, original_name, meta['uploaded_at'],
+                  meta['size_bytes'], meta['width'], meta['height'],
+                  digest, ext, created, meta['variants'], record_no))
+            if created:
+                conn.execute('UPDATE ball_images SET variants = ? WHERE sha256 = ? AND ext = ?',
+                             (meta['variants'], digest, ext))
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def discard(db_path, upload_folder, digest, ext):
+    """Delete a stored file and its variants, unless a ball shows it"""
+    conn = sqlite3.connect(db_path)
+    try:
+        if conn.execute('SELECT 1 FROM ball_images WHERE sha256 = ? AND ext = ?',
+                        (digest, ext)).fetchone():
+            return
+    finally:
+        conn.close()
+    folder = object_folder(upload_folder, digest)
+    filename = object_name(digest, ext)
+    for name in [filename] + image_variants.existing_variants(folder, filename):
+        os.unlink(os.path.join(folder, name))
+
+
+def ball_images(db, record_no):
+    """The stored images attached to a ball, primary first"""
+    return db.execute("""
+        SELECT sha256, ext, original_name, uploaded_at, size_bytes, width, height, variants, is_primary
+        FROM ball_images
+        WHERE record_no = ? ORDER BY is_primary DESC, id
+    """, (record_no,)).fetchall()
+
+
+def stored_variants(db, filename):
+    """The variant names recorded for a stored file, e.g. <sha256>.png"""
+    digest, _, ext = filename.partition('.')
+    row = db.execute('SELECT variants FROM ball_images WHERE sha256 = ? AND ext = ? LIMIT 1',
+                     (digest, ext)).fetchone()
+    return json.loads(row[0]) if row and row[0] else []
+
+
+def _legacy_order(filename):
+    # Legacy uploads are numbered 1_<name>, 2_<name>, ...
+    number = filename.split('_', 1)[0]
+    return (int(number) if number.isdigit() else float('inf'), filename)
+
+
+def import_legacy(db_path, upload_folder, extensions):
+    """Move uploads from before the store (static/uploads/ball_<n>/) into
+    it, once. The old files are left where they are so old links keep
+    working."""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'legacy_images_imported'").fetchone()
+    finally:
+        conn.close()
+    if row and row[0]:
+        return 0
+
+    imported = 0
+    for entry in sorted(os.listdir(upload_folder)):
+        number = entry[len('ball_'):]
+        if not entry.startswith('ball_') or not number.isdigit():
+            continue
+        folder = os.path.join(upload_folder, entry)
+        for filename in sorted(os.listdir(folder), key=_legacy_order):
+            ext = filename.rsplit('.', 1)[-1].lower()
+            if '.' not in filename or ext not in extensions or image_variants.is_variant(filename):
+                continue
+            path = os.path.join(folder, filename)
+            uploaded_at = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+            with open(path, 'rb') as stream:
+                result = add_image(db_path, upload_folder, int(number), stream, filename,
+                                   uploaded_at.strftime('%Y-%m-%d %H:%M:%S'))
+            imported += result['linked']
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('legacy_images_imported', 1)")
+    finally:
+        conn.close()
+    if imported:
+        bump_data_version(db_path)
+    return imported
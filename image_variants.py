@@ -0,0 +1,125 @@
+"""
+Golf Ball Image Variants
+Resized WebP and JPEG copies of uploaded photos, so cards and detail views
+download a few kilobytes instead of the original upload.
+
+Variants are written next to the stored object as <sha256>@<size>.<ext>,
+e.g. 3f2a...9c@thumb.webp. Object names are a hex digest and an
+extension, so they never contain an '@' and can't be mistaken for a
+variant.
+"""
+
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it originals are served as-is
+    Image = None
+
+# What Pillow raises for a file it can't or won't decode. A decompression
+# bomb (a small file claiming gigapixels) is not an OSError.
+DECODE_ERRORS = (OSError, ValueError) + ((Image.DecompressionBombError,) if Image else ())
+
+# Variant name -> longest edge in pixels, smallest first
+VARIANT_SIZES = {
+    'thumb': 240,
+    'medium': 800,
+    'full': 1600,
+}
+
+# Extension -> (Pillow format, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(filename, size, ext):
+    stem = os.path.splitext(filename)[0]
+    return f'{stem}@{size}.{ext}'
+
+
+def is_variant(filename):
+    return '@' in filename
+
+
+def existing_variants(folder, filename):
+    """Names of the variants of filename present in folder"""
+    names = [variant_name(filename, size, ext) for size in VARIANT_SIZES for ext in VARIANT_FORMATS]
+    return [name for name in names if os.path.exists(os.path.join(folder, name))]
+
+
+def image_size(path):
+    """(width, height) of an image file, or (None, None) if it can't be read"""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            # EXIF orientations 5-8 are rotated a quarter turn
+            if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+    except DECODE_ERRORS:
+        return None, None
+
+
+def generate_variants(folder, filename):
+    """Write every size/format variant of folder/filename.
+
+    Returns the variant file names created; an empty list when Pillow is not
+    installed or the upload cannot be decoded as an image.
+    """
+    if Image is None:
+        return []
+
+    created = []
+    try:
+        with Image.open(os.path.join(folder, filename)) as original:
+            largest = max(VARIANT_SIZES.values())
+            # Lets JPEG decode straight at reduced scale - much cheaper for
+            # big camera photos
+            original.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            for size, edge in VARIANT_SIZES.items():
+                resized = image.copy()
+                resized.thumbnail((edge, edge), Image.LANCZOS)
+                for ext, (fmt, options) in VARIANT_FORMATS.items():
+                    out = resized
+                    if fmt == 'JPEG' and out.mode == 'RGBA':
+                        # JPEG has no alpha; flatten onto white
+                        out = Image.new('RGB', resized.size, (255, 255, 255))
+                        out.paste(resized, mask=resized.getchannel('A'))
+                    name = variant_name(filename, size, ext)
+                    # Written aside and renamed, so a half-written variant
+                    # is never served
+                    path = os.path.join(folder, name)
+                    try:
+                        out.save(f'{path}.tmp', fmt, **options)
+                        os.replace(f'{path}.tmp', path)
+                    except BaseException:
+                        if os.path.exists(f'{path}.tmp'):
+                            os.unlink(f'{path}.tmp')
+                        raise
+                    created.append(name)
+    except DECODE_ERRORS:
+        # Not decodable (or Pillow lacks a codec) - keep just the original
+        return created
+
+    return created
+
+
+def pick_variant(filename, variants, width, accept_webp):
+    """Name of the smallest of a file's variants (as recorded in
+    ball_images) at least `width` pixels wide, falling back to the largest
+    variant and then to the original"""
+    ext = 'webp' if accept_webp else 'jpg'
+    size = next((name for name, edge in VARIANT_SIZES.items() if edge >= width),
+                list(VARIANT_SIZES)[-1])
+    name = variant_name(filename, size, ext)
+    if name in variants:
+        return name
+    return filename
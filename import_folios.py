@@ -4,15 +4,61 @@ Golf Ball Folio Import Script
 Imports Folios II, III, and IV into the golf_balls_v2.db database
 """
 
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import numpy as np
+import openpyxl
 import pandas as pd
 import sqlite3
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import schema
+import catalog_stats
+from catalog_db import bump_data_version
+
 # Configuration
 DB_PATH = '/home/humphrey/.openclaw/workspace/projects/humphrey-golf/golf_balls_v2.db'
 FOLIOS_DIR = '/home/humphrey/.openclaw/workspace/kevin_files/folios'
+REJECTS_DIR = '.'
+
+# golf_balls columns filled from a processed folio, besides record_no and folio
+INSERT_COLUMNS = [
+    'ball_name', 'ball_name_format', 'era', 'era_start', 'era_end', 'era_sort',
+    'cover_pattern', 'manufacturer', 'specs', 'patents_legal', 'auction_remarks',
+    'condition_grade', 'value_raw', 'value_low', 'value_high', 'value_mid', 'currency',
+    'country', 'rarity_score',
+]
+# Those of them golf_balls declares NOT NULL
+REQUIRED_COLUMNS = ['ball_name']
+
+# Import-time settings. A load runs in one transaction and can simply be
+# re-run, so durability is traded for speed while it runs.
+BULK_PRAGMAS = [
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+]
+
+# Rows per chunk when streaming a workbook (--stream)
+CHUNK_ROWS = 5000
+
+# Strings pd.read_excel reads as missing values; the streaming reader does
+# the same so both paths see identical sheets
+EXCEL_NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+# Loads adding at least this fraction of the table's rows drop its secondary
+# indexes and search triggers, and rebuild them once at the end
+REINDEX_FRACTION = 0.25
 
 # Column mapping for each folio (normalized names)
 COLUMN_MAPPINGS = {
@@ -69,6 +115,26 @@ def normalize_column_names(df, folio_num):
     return df
 
 
+# Era formats, in the order they are tried
+ERA_RELATIVE = r'(EARLY|MID|LATE)\s+(\d{2})0S'  # "Late 1910s", "Early 1920s"
+ERA_DECADE = r'(\d{4})S'  # "1910s", "1920s"
+ERA_YEAR = r'(\d{4})'  # "1906" - exact year
+ERA_RANGE = r'(\d{4})[-/](\d{4})'  # "1906-1910", "1906/1910"
+ERA_SHORT_DECADE = r'(\d{3})0S'  # "1900s" - decade
+ERA_RELATIVE_RE = re.compile(f'^{ERA_RELATIVE}$')
+ERA_DECADE_RE = re.compile(f'^{ERA_DECADE}$')
+ERA_YEAR_RE = re.compile(f'^{ERA_YEAR}$')
+ERA_RANGE_RE = re.compile(f'^{ERA_RANGE}$')
+ERA_SHORT_DECADE_RE = re.compile(f'^{ERA_SHORT_DECADE}$')
+# All of the above in one pass; the first alternative that matches wins,
+# just as when they are tried one by one
+ERA_FORMATS_RE = re.compile(f'^(?:{ERA_RELATIVE}|{ERA_DECADE}|{ERA_YEAR}|{ERA_RANGE}|{ERA_SHORT_DECADE})$')
+ERA_ANY_YEAR_RE = re.compile(r'(\d{4})')  # Fallback: first 4-digit year anywhere
+
+# Years added to the century for the end of an EARLY/MID/LATE era
+ERA_RELATIVE_END = {'EARLY': 49, 'MID': 50, 'LATE': 99}
+
+
 def parse_era(era_str):
     """Parse era string into era_start, era_end, era_sort"""
     if pd.isna(era_str) or era_str == '':
@@ -78,29 +144,24 @@ def parse_era(era_str):
     
     # Handle specific patterns
     patterns = [
-        # "Late 1910s", "Early 1920s", "Mid 1930s"
-        (r'^(EARLY|MID|LATE)\s+(\d{2})0S$', lambda m: (int(m.group(2)) * 100, int(m.group(2)) * 100 + 49 if m.group(1) == 'EARLY' else (int(m.group(2)) * 100 + 50 if m.group(1) == 'MID' else int(m.group(2)) * 100 + 99))),
-        # "1910s", "1920s"
-        (r'^(\d{4})S$', lambda m: (int(m.group(1)), int(m.group(1)) + 9)),
-        # "1906", "1910" - exact year
-        (r'^(\d{4})$', lambda m: (int(m.group(1)), int(m.group(1)))),
-        # "1906-1910", "1906/1910"
-        (r'^(\d{4})[-/](\d{4})$', lambda m: (int(m.group(1)), int(m.group(2)))),
-        # "1900s" - decade
-        (r'^(\d{3})0S$', lambda m: (int(m.group(1)) * 10, int(m.group(1)) * 10 + 9)),
+        (ERA_RELATIVE_RE, lambda m: (int(m.group(2)) * 100, int(m.group(2)) * 100 + ERA_RELATIVE_END[m.group(1)])),
+        (ERA_DECADE_RE, lambda m: (int(m.group(1)), int(m.group(1)) + 9)),
+        (ERA_YEAR_RE, lambda m: (int(m.group(1)), int(m.group(1)))),
+        (ERA_RANGE_RE, lambda m: (int(m.group(1)), int(m.group(2)))),
+        (ERA_SHORT_DECADE_RE, lambda m: (int(m.group(1)) * 10, int(m.group(1)) * 10 + 9)),
     ]
     
     for pattern, extractor in patterns:
-        match = re.match(pattern, era_str)
+        match = pattern.match(era_str)
         if match:
             start, end = extractor(match)
             # For era_sort, use the start year
             return start, end, start
     
     # Default: try to extract any 4-digit year
-    years = re.findall(r'\d{4}', era_str)
-    if years:
-        year = int(years[0])
+    match = ERA_ANY_YEAR_RE.search(era_str)
+    if match:
+        year = int(match.group(1))
         return year, year, year
     
     return None, None, None
@@ -177,6 +238,139 @@ def clean_cover_pattern(pattern):
     return pattern
 
 
+def _distinct(column):
+    """Factorize a column's text: (codes, distinct values).
+
+    Folios repeat the same eras and valuations over and over, so each
+    distinct value is parsed once and the results are spread back with the
+    codes. The text is kept as Python strings (object dtype), so the string
+    methods behave exactly as they do in the scalar parsers.
+    """
+    codes, uniques = pd.factorize(column.astype(object).map(str, na_action='ignore'))
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def _spread(values, codes, missing, fill=None):
+    """Per-row results from per-distinct-value results, as the column
+    Series.apply would build from the scalar parsers' return values"""
+    # Code -1 (missing) picks the appended fill value
+    values = np.append(np.asarray(values, dtype=object), [fill])[codes]
+    values[missing.to_numpy()] = fill
+    values[pd.isna(values)] = None
+    return pd.Series(values.tolist(), index=missing.index)
+
+
+def _integers(values):
+    """Float results that stand for whole years, as ints (None for NaN)"""
+    whole = np.where(np.isnan(values), 0, values).astype('int64').astype(object)
+    whole[np.isnan(values)] = None
+    return whole
+
+
+def parse_eras(eras):
+    """parse_era for a whole column at once.
+
+    All era formats are matched in one str.extract pass, and np.select
+    takes the result from the first format that matched, the same order
+    parse_era tries them in. Returns era_start, era_end and era_sort columns.
+    """
+    missing = eras.isna() | (eras == '')
+    codes, distinct = _distinct(eras)
+    text = distinct.str.strip().str.upper()
+    
+    formats = text.str.extract(ERA_FORMATS_RE).astype({i: float for i in range(1, 7)})
+    relative_end = np.select([formats[0] == word for word in ERA_RELATIVE_END],
+                             list(ERA_RELATIVE_END.values()), 0)
+    century = formats[1].to_numpy() * 100
+    decade = formats[2].to_numpy()
+    year = formats[3].to_numpy()
+    span_start, span_end = formats[4].to_numpy(), formats[5].to_numpy()
+    short_decade = formats[6].to_numpy() * 10
+    # Only eras in none of the formats need the any-year fallback
+    any_year = np.full(len(text), np.nan)
+    other = formats.isna().all(axis=1).to_numpy()
+    any_year[other] = text[other].str.extract(ERA_ANY_YEAR_RE)[0].astype(float).to_numpy()
+    
+    matched = [~np.isnan(century), ~np.isnan(decade), ~np.isnan(year),
+               ~np.isnan(span_start), ~np.isnan(short_decade), ~np.isnan(any_year)]
+    start = np.select(matched, [century, decade, year, span_start, short_decade, any_year], np.nan)
+    end = np.select(matched, [century + relative_end, decade + 9, year, span_end,
+                              short_decade + 9, any_year], np.nan)
+    
+    start = _spread(_integers(start), codes, missing)
+    return pd.DataFrame({
+        'era_start': start,
+        'era_end': _spread(_integers(end), codes, missing),
+        'era_sort': start.copy(),
+    })
+
+
+# Plain amounts and ranges, e.g. "300", "1,250.00", "300/400", "40 - 60".
+# Anything else goes through parse_value one value at a time.
+VALUE_NUMBER = r'[ \t]*([0-9]+\.?[0-9]*|\.[0-9]+)[ \t]*'
+VALUE_RANGE_RE = re.compile(f'^(?:{VALUE_NUMBER}/{VALUE_NUMBER}|{VALUE_NUMBER}-{VALUE_NUMBER})$')
+VALUE_SINGLE_RE = re.compile(r'^([0-9]+\.?[0-9]*|\.[0-9]+)$')
+
+
+def parse_values(values):
+    """parse_value for a whole column at once.
+
+    The common shapes (single amounts and two-number ranges) are parsed
+    with vectorized string operations; the rare leftovers fall back to
+    parse_value, so the results are identical. Returns value_low,
+    value_high, value_mid and currency columns.
+    """
+    missing = values.isna() | (values == '')
+    codes, distinct = _distinct(values)
+    text = distinct.str.strip()
+    
+    usd = text.str.contains('$', regex=False) | text.str.contains('USD', regex=False)
+    currency = np.where(usd, 'USD', 'GBP').astype(object)
+    amount = (text.str.replace('£', '', regex=False).str.replace('$', '', regex=False)
+              .str.replace('USD', '', regex=False).str.strip())
+    
+    ranges = amount.str.extract(VALUE_RANGE_RE).astype(float).to_numpy()
+    slash, dash = ranges[:, 0:2], ranges[:, 2:4]
+    # parse_value only reads a single amount when there is no '/' or '-'
+    single = np.full(len(amount), np.nan)
+    plain = ~(amount.str.contains('/', regex=False) | amount.str.contains('-', regex=False)).to_numpy()
+    single[plain] = amount[plain].str.replace(',', '', regex=False).str.extract(VALUE_SINGLE_RE)[0].astype(float).to_numpy()
+    
+    is_slash = ~np.isnan(slash[:, 0])
+    is_dash = ~np.isnan(dash[:, 0])
+    is_single = ~np.isnan(single)
+    # Ranges written high/low are swapped
+    slash_low = np.minimum(slash[:, 0], slash[:, 1])
+    slash_high = np.maximum(slash[:, 0], slash[:, 1])
+    
+    shapes = [is_slash, is_dash, is_single]
+    low = np.select(shapes, [slash_low, dash[:, 0], single], np.nan).astype(object)
+    high = np.select(shapes, [slash_high, dash[:, 1], single], np.nan).astype(object)
+    mid = np.select(shapes, [(slash_low + slash_high) / 2, (dash[:, 0] + dash[:, 1]) / 2, single],
+                    np.nan).astype(object)
+    
+    for i in np.flatnonzero(~(is_slash | is_dash | is_single)):
+        low[i], high[i], mid[i], currency[i] = parse_value(distinct[i])
+    
+    return pd.DataFrame({
+        'value_low': _spread(low, codes, missing),
+        'value_high': _spread(high, codes, missing),
+        'value_mid': _spread(mid, codes, missing),
+        'currency': _spread(currency, codes, missing, fill='GBP'),  # Default to GBP for folios II-IV
+    })
+
+
+def clean_cover_patterns(patterns):
+    """clean_cover_pattern for a whole column at once"""
+    missing = patterns.isna() | (patterns == '')
+    codes, distinct = _distinct(patterns)
+    text = distinct.str.strip()
+    assumption = text.str.upper().str.startswith('ASSUMPTION:')
+    text = text.where(~assumption, text.str[11:].str.strip())
+    text = text.str.replace('\n', ' ', regex=False).str.replace('  ', ' ', regex=False)
+    return _spread(text.to_numpy(dtype=object), codes, missing)
+
+
 def extract_country(manufacturer_str):
     """Extract country from manufacturer string"""
     if pd.isna(manufacturer_str):
@@ -205,19 +399,8 @@ def extract_country(manufacturer_str):
     return 'Unknown'
 
 
-def process_folio(folio_num, file_name):
-    """Process a single folio Excel file"""
-    print(f"\n{'='*60}")
-    print(f"Processing Folio {folio_num}: {file_name}")
-    print('='*60)
-    
-    # Read Excel file
-    file_path = os.path.join(FOLIOS_DIR, file_name)
-    df = pd.read_excel(file_path)
-    
-    print(f"Raw rows: {len(df)}")
-    print(f"Raw columns: {list(df.columns)}")
-    
+def clean_folio_frame(df, folio_num):
+    """Normalize and parse raw sheet rows - a whole folio or a chunk of one"""
     # Normalize column names
     df = normalize_column_names(df, folio_num)
     
@@ -225,26 +408,15 @@ def process_folio(folio_num, file_name):
     df['folio'] = folio_num
     
     # Parse era
-    print("Parsing eras...")
-    era_data = df['era'].apply(parse_era)
-    df['era_start'] = era_data.apply(lambda x: x[0] if x else None)
-    df['era_end'] = era_data.apply(lambda x: x[1] if x else None)
-    df['era_sort'] = era_data.apply(lambda x: x[2] if x else None)
+    df[['era_start', 'era_end', 'era_sort']] = parse_eras(df['era'])
     
     # Parse values
-    print("Parsing values...")
-    value_data = df['value_raw'].apply(parse_value)
-    df['value_low'] = value_data.apply(lambda x: x[0] if x else None)
-    df['value_high'] = value_data.apply(lambda x: x[1] if x else None)
-    df['value_mid'] = value_data.apply(lambda x: x[2] if x else None)
-    df['currency'] = value_data.apply(lambda x: x[3] if x else 'GBP')
+    df[['value_low', 'value_high', 'value_mid', 'currency']] = parse_values(df['value_raw'])
     
     # Clean cover pattern
-    print("Cleaning cover patterns...")
-    df['cover_pattern'] = df['cover_pattern'].apply(clean_cover_pattern)
+    df['cover_pattern'] = clean_cover_patterns(df['cover_pattern'])
     
     # Extract country
-    print("Extracting countries...")
     df['country'] = df['manufacturer'].apply(extract_country)
     
     # Set default condition_grade and rarity_score
@@ -262,13 +434,98 @@ def process_folio(folio_num, file_name):
     df['record_no'] = pd.to_numeric(df['record_no'], errors='coerce')
     
     # Remove rows with null record_no
-    df = df[df['record_no'].notna()]
+    return df[df['record_no'].notna()]
+
+
+def process_folio(folio_num, file_name, folios_dir=None):
+    """Process a single folio Excel file"""
+    print(f"\n{'='*60}")
+    print(f"Processing Folio {folio_num}: {file_name}")
+    print('='*60)
+    
+    # Read Excel file
+    file_path = os.path.join(folios_dir or FOLIOS_DIR, file_name)
+    df = pd.read_excel(file_path)
+    
+    print(f"Raw rows: {len(df)}")
+    print(f"Raw columns: {list(df.columns)}")
+    
+    print("Parsing eras, values, cover patterns and countries...")
+    df = clean_folio_frame(df, folio_num)
     
     print(f"Processed rows: {len(df)}")
     
     return df
 
 
+def parse_folio(folio_num, file_name, folios_dir):
+    """process_folio in a worker process. Returns (df, what it printed), so
+    the output can be shown in folio order rather than interleaved."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        df = process_folio(folio_num, file_name, folios_dir)
+    return df, out.getvalue()
+
+
+def _header_names(header):
+    """Column names as pd.read_excel would give them"""
+    names, seen = [], {}
+    for i, name in enumerate(header):
+        if name is None:
+            name = f'Unnamed: {i}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _cell_value(value):
+    """A cell as pd.read_excel would read it: whole numbers as ints,
+    missing-value markers and error cells as None"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (value in EXCEL_NA_STRINGS or value in openpyxl.cell.cell.ERROR_CODES):
+        return None
+    return value
+
+
+def read_folio_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    """Yield a workbook's first sheet as DataFrames of up to chunk_rows rows.
+
+    The sheet is read row by row in openpyxl's read-only mode, so memory
+    use depends on the chunk size, not on the size of the workbook. Blank
+    rows are skipped and the index runs on across chunks, as with
+    pd.read_excel. Columns are left as object dtype: pd.read_excel would
+    choose dtypes from the whole column, which a chunk can't see.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header_names(header)
+        width = len(columns)
+        
+        chunk, start = [], 0
+        for row in rows:
+            values = [_cell_value(v) for v in row[:width]]
+            if all(v is None for v in values):
+                continue
+            chunk.append(values + [None] * (width - len(values)))
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)), dtype=object)
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)), dtype=object)
+    finally:
+        workbook.close()
+
+
 def update_database_schema():
     """Add folio column to database if it doesn't exist"""
     conn = sqlite3.connect(DB_PATH)
@@ -290,64 +547,325 @@ def update_database_schema():
     conn.close()
 
 
-def import_to_database(df, folio_num):
-    """Import processed dataframe to database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Get max record_no to avoid conflicts (folio balls get new record numbers)
-    cursor.execute("SELECT MAX(record_no) FROM golf_balls")
-    max_record = cursor.fetchone()[0] or 0
-    
-    # For folios 2-4, we'll add to the existing records with new record numbers
-    # This preserves the original folio I data
-    
-    records_imported = 0
-    errors = []
-    
-    for idx, row in df.iterrows():
+def frame_rows(df):
+    """INSERT_COLUMNS of every row as plain Python tuples (NaN -> None),
+    converted once for the whole frame"""
+    columns = df.reindex(columns=INSERT_COLUMNS).astype(object)
+    columns = columns.where(columns.notna(), None)
+    return list(columns.itertuples(index=False, name=None))
+
+
+def split_rejects(df, rows):
+    """Separate rows that can't be stored: a NOT NULL column missing, or a
+    source record number already used further up the frame.
+
+    Returns (good rows, rejects). Good rows are (spreadsheet row, source
+    record number, row); each reject is (spreadsheet row, source record
+    number, reason, row).
+    """
+    required = [INSERT_COLUMNS.index(col) for col in REQUIRED_COLUMNS]
+    good, rejects = [], []
+    seen = set()
+    for index, source, row in zip(df.index, df['record_no'], rows):
+        missing = [INSERT_COLUMNS[i] for i in required if row[i] is None]
+        if missing:
+            rejects.append((index, int(source), f"missing {', '.join(missing)}", row))
+        elif int(source) in seen:
+            rejects.append((index, int(source), f"duplicate record number {int(source)}", row))
+        else:
+            seen.add(int(source))
+            good.append((index, int(source), row))
+    return good, rejects
+
+
+def drop_derived_objects(conn):
+    """Drop golf_balls' secondary indexes and triggers, returning the SQL
+    to recreate them"""
+    objects = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'golf_balls' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    return objects
+
+
+def restore_derived_objects(conn, objects):
+    for _, _, sql in objects:
+        conn.execute(sql)
+    # The search index missed every row loaded without its triggers
+    if any(kind == 'trigger' for kind, _, _ in objects):
+        schema.rebuild_search_index(conn)
+
+
+def row_fingerprint(*values):
+    """Content hash of a ball's imported columns. Registered as an SQL
+    function, so rows from the sheet and rows already stored are hashed after
+    the same column type conversions."""
+    return hashlib.sha1(json.dumps(values, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class FolioImport:
+    """Brings one folio in the database in line with its sheet.
+
+    Sheet rows are staged in a temp table with add(), in one go or chunk by
+    chunk; apply() then diffs them against the database. Rows are keyed by
+    (folio, source record number) and compared by fingerprint: new rows are
+    inserted, changed ones updated and rows gone from the sheet deleted,
+    along with their images. Unchanged rows aren't touched, so re-running an
+    import is a no-op.
+
+    Everything happens in one transaction, committed when the with block
+    exits cleanly. Rows that can't be stored are written to
+    rejects_folio_<n>.csv in rejects_dir; a ball whose row was rejected is
+    left as it is, not deleted, so it keeps its record number once the
+    sheet is fixed.
+    """
+
+    def __init__(self, folio_num, rejects_dir=None, temp_store='MEMORY'):
+        self.folio_num = folio_num
+        self.rejects_path = os.path.join(rejects_dir or REJECTS_DIR, f'rejects_folio_{folio_num}.csv')
+        self.temp_store = temp_store
+        self.errors = []
+        self.staged = 0
+        self._rejects_file = None
+        self._rejects_writer = None
+
+    def __enter__(self):
+        conn = self.conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.create_function('row_fingerprint', -1, row_fingerprint, deterministic=True)
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f'PRAGMA temp_store = {self.temp_store}')
+        # A rollback journal in memory is faster than WAL for one big write,
+        # but the mode can only be changed while nobody else has the file open
+        self.journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
         try:
-            max_record += 1
-            
-            cursor.execute("""
-                INSERT INTO golf_balls (
-                    record_no, ball_name, ball_name_format, era, era_start, era_end, era_sort,
-                    cover_pattern, manufacturer, specs, patents_legal, auction_remarks,
-                    condition_grade, value_raw, value_low, value_high, value_mid, currency,
-                    country, rarity_score, folio
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                max_record,
-                row.get('ball_name'),
-                row.get('ball_name_format'),
-                row.get('era'),
-                row.get('era_start'),
-                row.get('era_end'),
-                row.get('era_sort'),
-                row.get('cover_pattern'),
-                row.get('manufacturer'),
-                row.get('specs'),
-                row.get('patents_legal'),
-                row.get('auction_remarks'),
-                row.get('condition_grade'),
-                row.get('value_raw'),
-                row.get('value_low'),
-                row.get('value_high'),
-                row.get('value_mid'),
-                row.get('currency'),
-                row.get('country'),
-                row.get('rarity_score', 0),
-                folio_num  # Set the folio number
-            ))
-            records_imported += 1
-            
-        except Exception as e:
-            errors.append(f"Row {idx}: {e}")
-    
-    conn.commit()
-    conn.close()
+            conn.execute('PRAGMA journal_mode = MEMORY')
+        except sqlite3.OperationalError:
+            pass
+        
+        conn.execute('BEGIN IMMEDIATE')
+        declared = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(golf_balls)')}
+        columns = ', '.join(f'{col} {declared[col]}' for col in INSERT_COLUMNS)
+        conn.execute(f"""
+            CREATE TEMP TABLE staging (
+                source_record_no INTEGER PRIMARY KEY,
+                position INTEGER NOT NULL,
+                {columns},
+                fingerprint TEXT
+            )
+        """)
+        # Source numbers of rejected rows: still in the sheet, so not removed
+        conn.execute('CREATE TEMP TABLE rejected (source_record_no INTEGER PRIMARY KEY)')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.execute('DROP TABLE temp.staging')
+                self.conn.execute('DROP TABLE temp.rejected')
+                self.conn.execute('COMMIT')
+            else:
+                self.conn.execute('ROLLBACK')
+            self.conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        finally:
+            self.conn.close()
+            if self._rejects_file:
+                self._rejects_file.close()
+                print(f"Rejected {len(self.errors)} rows, see {self.rejects_path}")
+
+    def add(self, df):
+        """Stage a processed frame of sheet rows"""
+        rows, rejects = split_rejects(df, frame_rows(df))
+        
+        # Numbers already used in an earlier chunk
+        sources = json.dumps([source for _, source, _ in rows])
+        taken = {r[0] for r in self.conn.execute(
+            "SELECT source_record_no FROM staging WHERE source_record_no IN (SELECT value FROM json_each(?))",
+            (sources,))}
+        if taken:
+            rejects += [(index, source, f"duplicate record number {source}", row)
+                        for index, source, row in rows if source in taken]
+            rows = [(index, source, row) for index, source, row in rows if source not in taken]
+        
+        placeholders = ', '.join('?' * (len(INSERT_COLUMNS) + 2))
+        self.conn.executemany(
+            f"INSERT INTO staging (source_record_no, position, {', '.join(INSERT_COLUMNS)}) VALUES ({placeholders})",
+            ((source, self.staged + i) + row for i, (_, source, row) in enumerate(rows))
+        )
+        self.conn.execute(f"""
+            UPDATE staging SET fingerprint = row_fingerprint({', '.join(INSERT_COLUMNS)})
+            WHERE fingerprint IS NULL
+        """)
+        self.staged += len(rows)
+        self._reject(rejects)
+
+    def _reject(self, rejects):
+        if not rejects:
+            return
+        if self._rejects_writer is None:
+            self._rejects_file = open(self.rejects_path, 'w', newline='', encoding='utf-8')
+            self._rejects_writer = csv.writer(self._rejects_file)
+            self._rejects_writer.writerow(['row', 'error'] + INSERT_COLUMNS)
+        for index, _, reason, row in rejects:
+            self._rejects_writer.writerow([index, reason] + list(row))
+            self.errors.append(f"Row {index}: {reason}")
+        self.conn.executemany('INSERT OR IGNORE INTO rejected (source_record_no) VALUES (?)',
+                              ((source,) for _, source, _, _ in rejects))
+
+    def adopt_legacy_rows(self):
+        """Key balls imported before folio_rows existed to their sheet rows.
+
+        The old importer numbered a folio's rows in sheet order, so rows are
+        paired by identical content first and the rest in order. A ball whose
+        content no longer matches then shows up as changed rather than being
+        deleted and re-added under a new record number.
+        """
+        legacy = self.conn.execute(f"""
+            SELECT record_no, row_fingerprint({', '.join(INSERT_COLUMNS)}) FROM golf_balls
+            WHERE folio = ? AND record_no NOT IN (SELECT record_no FROM folio_rows)
+            ORDER BY record_no
+        """, (self.folio_num,)).fetchall()
+        if not legacy:
+            return 0
+        sheet = self.conn.execute("""
+            SELECT source_record_no, fingerprint FROM staging
+            WHERE source_record_no NOT IN (SELECT source_record_no FROM folio_rows WHERE folio = ?)
+            ORDER BY position
+        """, (self.folio_num,)).fetchall()
+        
+        by_fingerprint = {}
+        for source, fingerprint in sheet:
+            by_fingerprint.setdefault(fingerprint, []).append(source)
+        paired, used, unmatched = [], set(), []
+        for record_no, fingerprint in legacy:
+            sources = by_fingerprint.get(fingerprint)
+            if sources:
+                source = sources.pop(0)
+                used.add(source)
+                paired.append((record_no, self.folio_num, source, fingerprint))
+            else:
+                unmatched.append((record_no, fingerprint))
+        remaining = [source for source, _ in sheet if source not in used]
+        for (record_no, fingerprint), source in zip(unmatched, remaining):
+            paired.append((record_no, self.folio_num, source, fingerprint))
+        
+        self.conn.executemany("""
+            INSERT INTO folio_rows (record_no, folio, source_record_no, fingerprint)
+            VALUES (?, ?, ?, ?)
+        """, paired)
+        return len(paired)
+
+    def apply(self):
+        """Diff the staged sheet against the database and write the changes.
+        Returns counts of inserted/updated/deleted/unchanged rows."""
+        conn, folio = self.conn, self.folio_num
+        adopted = self.adopt_legacy_rows()
+        if adopted:
+            print(f"Keyed {adopted} previously imported rows to the sheet")
+        
+        new_sql = """
+            SELECT source_record_no FROM staging
+            WHERE source_record_no NOT IN (SELECT source_record_no FROM folio_rows WHERE folio = ?)
+        """
+        changed_sql = """
+            SELECT k.record_no FROM folio_rows k
+            JOIN staging s ON s.source_record_no = k.source_record_no
+            WHERE k.folio = ? AND k.fingerprint != s.fingerprint
+        """
+        removed_sql = """
+            SELECT record_no FROM folio_rows
+            WHERE folio = ? AND source_record_no NOT IN (SELECT source_record_no FROM staging)
+              AND source_record_no NOT IN (SELECT source_record_no FROM rejected)
+        """
+        conn.execute('CREATE TEMP TABLE changed (record_no INTEGER PRIMARY KEY)')
+        conn.execute(f'INSERT INTO changed {changed_sql}', (folio,))
+        changes = {
+            'inserted': conn.execute(f'SELECT COUNT(*) FROM ({new_sql})', (folio,)).fetchone()[0],
+            'updated': conn.execute('SELECT COUNT(*) FROM changed').fetchone()[0],
+            'deleted': conn.execute(f'SELECT COUNT(*) FROM ({removed_sql})', (folio,)).fetchone()[0],
+        }
+        changes['unchanged'] = self.staged - changes['inserted'] - changes['updated']
+        
+        max_record, existing = conn.execute(
+            "SELECT COALESCE(MAX(record_no), 0), COUNT(*) FROM golf_balls").fetchone()
+        
+        derived = []
+        if changes['inserted'] + changes['updated'] + changes['deleted'] >= existing * REINDEX_FRACTION:
+            derived = drop_derived_objects(conn)
+        
+        columns = ', '.join(INSERT_COLUMNS)
+        staged_columns = ', '.join(f's.{col}' for col in INSERT_COLUMNS)
+        
+        conn.execute(f"""
+            UPDATE golf_balls SET ({columns}) = ({staged_columns})
+            FROM folio_rows k JOIN staging s ON s.source_record_no = k.source_record_no
+            WHERE k.record_no = golf_balls.record_no
+              AND golf_balls.record_no IN (SELECT record_no FROM changed)
+        """)
+        conn.execute("""
+            UPDATE folio_rows SET fingerprint = s.fingerprint
+            FROM staging s
+            WHERE s.source_record_no = folio_rows.source_record_no AND folio_rows.folio = ?
+              AND folio_rows.record_no IN (SELECT record_no FROM changed)
+        """, (folio,))
+        conn.execute('DROP TABLE temp.changed')
+        
+        # New rows get record numbers after every existing ball (folio I
+        # included), in sheet order
+        conn.execute(f"""
+            INSERT INTO folio_rows (record_no, folio, source_record_no, fingerprint)
+            SELECT ? + ROW_NUMBER() OVER (ORDER BY position), ?, source_record_no, fingerprint
+            FROM staging WHERE source_record_no IN ({new_sql})
+        """, (max_record, folio, folio))
+        conn.execute(f"""
+            INSERT INTO golf_balls (record_no, {columns}, folio)
+            SELECT k.record_no, {staged_columns}, k.folio
+            FROM staging s JOIN folio_rows k ON k.folio = ? AND k.source_record_no = s.source_record_no
+            WHERE k.record_no > ?
+            ORDER BY k.record_no
+        """, (folio, max_record))
+        
+        # A removed ball's record number can be reused by a later insert, so
+        # its images must not outlive it
+        conn.execute(f'DELETE FROM ball_images WHERE record_no IN ({removed_sql})', (folio,))
+        conn.execute(f'DELETE FROM golf_balls WHERE record_no IN ({removed_sql})', (folio,))
+        conn.execute(f'DELETE FROM folio_rows WHERE record_no IN ({removed_sql})', (folio,))
+        
+        restore_derived_objects(conn, derived)
+        return changes
+
+
+def import_to_database(df, folio_num, rejects_dir=None):
+    """Import processed dataframe to database, see FolioImport.
+    Returns (counts of inserted/updated/deleted/unchanged rows, errors)."""
+    with FolioImport(folio_num, rejects_dir) as folio_import:
+        folio_import.add(df)
+        changes = folio_import.apply()
+    return changes, folio_import.errors
+
+
+def stream_folio(folio_num, file_name, rejects_dir=None, chunk_rows=CHUNK_ROWS):
+    """Read, process and stage a folio chunk by chunk, then import it.
+
+    Only one chunk of the workbook is held in memory at a time; the staged
+    rows wait in an on-disk temp table. Returns (rows read, changes, errors)
+    like process_folio and import_to_database together.
+    """
+    print(f"\n{'='*60}")
+    print(f"Streaming Folio {folio_num}: {file_name}")
+    print('='*60)
     
-    return records_imported, errors
+    rows_read = 0
+    with FolioImport(folio_num, rejects_dir, temp_store='FILE') as folio_import:
+        for chunk in read_folio_chunks(os.path.join(FOLIOS_DIR, file_name), chunk_rows):
+            rows_read += len(chunk)
+            folio_import.add(clean_folio_frame(chunk, folio_num))
+        print(f"Read {rows_read} rows, staged {folio_import.staged}")
+        print("Importing to database...")
+        changes = folio_import.apply()
+    return rows_read, changes, folio_import.errors
 
 
 def validate_import():
@@ -396,12 +914,33 @@ def validate_import():
     return total
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Import Folios II-IV into the golf ball database')
+    parser.add_argument('--db', default=DB_PATH, help='database file (default: %(default)s)')
+    parser.add_argument('--folios-dir', default=FOLIOS_DIR, help='folder with the folio workbooks')
+    parser.add_argument('--rejects-dir', default=REJECTS_DIR,
+                        help='where to write rejects_folio_<n>.csv for rows that could not be imported')
+    parser.add_argument('--stream', action='store_true',
+                        help='read workbooks in chunks instead of whole, for files too big for memory')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='rows per chunk with --stream (default: %(default)s)')
+    parser.add_argument('--workers', type=int,
+                        help='folios to parse at once in separate processes '
+                             '(default: one per folio, up to the CPU count; ignored with --stream)')
+    return parser.parse_args()
+
+
 def main():
+    global DB_PATH, FOLIOS_DIR
+    args = parse_args()
+    DB_PATH, FOLIOS_DIR = args.db, args.folios_dir
+    
     print("GOLF BALL FOLIO IMPORT")
     print("="*60)
     
     # Update schema
     update_database_schema()
+    schema.migrate(DB_PATH)
     
     # Process each folio
     folios = [
@@ -412,22 +951,45 @@ def main():
     
     import_stats = {}
     
+    # Parsing is CPU-bound and independent per folio, so it runs in worker
+    # processes; this process is the only writer and imports each folio as
+    # soon as it and every folio before it are parsed. Streaming reads one
+    # folio at a time to keep memory flat.
+    workers = 1 if args.stream else args.workers or min(len(folios), os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    parsed = {}
+    if pool:
+        print(f"Parsing with {workers} worker processes")
+        parsed = {folio_num: pool.submit(parse_folio, folio_num, file_name, FOLIOS_DIR)
+                  for folio_num, file_name in folios}
+    
     for folio_num, file_name in folios:
         try:
-            # Process the folio
-            df = process_folio(folio_num, file_name)
-            
-            # Import to database
-            print(f"Importing to database...")
-            imported, errors = import_to_database(df, folio_num)
+            if args.stream:
+                processed, changes, errors = stream_folio(folio_num, file_name, args.rejects_dir,
+                                                          args.chunk_rows)
+            else:
+                # Process the folio
+                if pool:
+                    df, output = parsed[folio_num].result()
+                    print(output, end='')
+                else:
+                    df = process_folio(folio_num, file_name)
+                processed = len(df)
+                
+                # Import to database
+                print(f"Importing to database...")
+                changes, errors = import_to_database(df, folio_num, args.rejects_dir)
             
             import_stats[folio_num] = {
-                'processed': len(df),
-                'imported': imported,
+                'processed': processed,
+                'imported': changes['inserted'] + changes['updated'] + changes['unchanged'],
+                'changed': changes['inserted'] + changes['updated'] + changes['deleted'],
                 'errors': len(errors)
             }
             
-            print(f"Successfully imported {imported} records")
+            print(f"Inserted {changes['inserted']}, updated {changes['updated']}, "
+                  f"deleted {changes['deleted']}, unchanged {changes['unchanged']}")
             if errors:
                 print(f"Errors: {len(errors)}")
                 for err in errors[:5]:  # Show first 5 errors
@@ -442,9 +1004,21 @@ def main():
                 'error_msg': str(e)
             }
     
+    if pool:
+        pool.shutdown()
+    
     # Validate
     total = validate_import()
     
+    # Refresh the precomputed stats served by /stats and the dashboard - only
+    # if something changed, so a repeat import leaves caches valid
+    if any(stats.get('changed') for stats in import_stats.values()):
+        print("\nRebuilding stats snapshots...")
+        catalog_stats.rebuild(DB_PATH)
+        bump_data_version(DB_PATH)
+    else:
+        print("\nNo changes - stats snapshots left as they are")
+    
     # Summary report
     print("\n" + "="*60)
     print("IMPORT SUMMARY")
@@ -452,7 +1026,7 @@ def main():
     print(f"\nFolio I (existing): 551 balls")
     for folio_num in [2, 3, 4]:
         stats = import_stats.get(folio_num, {})
-        print(f"Folio {folio_num}: {stats.get('imported', 0)} balls imported")
+        print(f"Folio {folio_num}: {stats.get('imported', 0)} balls imported, {stats.get('changed', 0)} changed")
     print(f"\nTotal in database: {total}")
     print(f"Expected total: 4,436")
     print(f"Difference: {total - 4436}")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Starts the app under gunicorn, as Render runs it, and replays a mix of
+browse, search, detail and dashboard requests at a fixed rate. It reports
+throughput and p50/p95/p99 latency for each route, so worker models can be
+compared and regressions caught.
+
+Requests are sent on a schedule (Poisson arrivals at --rate per second),
+not one after another. Latency is measured from when each request was
+due, so a server that falls behind shows its queueing delay instead of
+quietly lowering the load.
+
+    python load_test.py --workers 2 --threads 1 --rate 50 -o sync.json
+    python load_test.py --workers 2 --threads 8 --rate 50 --compare sync.json
+    python load_test.py --url http://localhost:8085     # an already running server
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from benchmark import DEFAULT_DB, git_commit, sample_values
+
+PORT = 8095
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 30
+
+# Route label, weight, path builder (sample values, random.Random). The
+# weights roughly follow how the site is used: mostly searching and
+# opening balls.
+MIX = [
+    ('/browse', 10, lambda s, rng: '/browse'),
+    ('/api/search', 40, lambda s, rng: '/api/search?' + urlencode(rng.choice(search_params(s, rng)))),
+    ('/ball/<n>', 25, lambda s, rng: f"/ball/{rng.choice(s['ids'])}"),
+    ('/api/ball/<n>', 10, lambda s, rng: f"/api/ball/{rng.choice(s['ids'])}"),
+    ('/api/dashboard/stats', 10, lambda s, rng: '/api/dashboard/stats'),
+    ('/stats', 5, lambda s, rng: '/stats'),
+]
+
+
+def search_params(sample, rng):
+    """The kinds of search the browse page sends"""
+    pages = max(1, sample['total'] // 20)
+    return [
+        {'q': sample['word']},
+        {'q': sample['word'], 'folio': rng.randint(1, 4)},
+        {'era': sample['era']},
+        {'pattern': sample['pattern'], 'sort': 'ball_name', 'order': 'ASC'},
+        {'country': sample['country'], 'page': rng.randint(1, 5)},
+        {'min_value': 100, 'max_value': 500},
+        {'page': rng.randint(1, pages)},
+        {'facets': 'folio,era,pattern,country'},
+    ]
+
+
+def schedule(sample, rate, duration, seed):
+    """(due time in seconds, route label, path) for every request to send"""
+    rng = random.Random(seed)
+    labels = [label for label, _, _ in MIX]
+    weights = [weight for _, weight, _ in MIX]
+    builders = {label: build for label, _, build in MIX}
+    due = 0.0
+    requests = []
+    while True:
+        due += rng.expovariate(rate)
+        if due >= duration:
+            return requests
+        label = rng.choices(labels, weights)[0]
+        requests.append((due, label, builders[label](sample, rng)))
+
+
+def start_server(args):
+    """Run gunicorn on the catalog and wait until it answers"""
+    env = dict(os.environ, GOLF_DB_PATH=args.db)
+    command = [sys.executable, '-m', 'gunicorn', 'app:app',
+               '--bind', f'127.0.0.1:{args.port}',
+               '--workers', str(args.workers),
+               '--threads', str(args.threads),
+               '--worker-class', args.worker_class,
+               '--log-level', 'warning']
+    print(f"Starting: {' '.join(command[2:])}")
+    server = subprocess.Popen(command, env=env)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=1)
+            conn.request('GET', '/api/dashboard/stats')
+            conn.getresponse().read()
+            conn.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+class Client:
+    """Sends requests over one keep-alive connection per client thread
+    (sync workers close it after every response; it is reopened as needed)"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def get(self, path):
+        """Status code of GET path; raises OSError/HTTPException on failure"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            raise
+
+
+def run(client, requests, concurrency, warmup):
+    """Send every request at its due time. Returns (elapsed seconds,
+    {label: [(latency or None, status), ...]}) for the requests due after
+    the warmup."""
+    results = {label: [] for label, _, _ in MIX}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def send(due, label, path):
+        try:
+            status = client.get(path)
+        except (OSError, http.client.HTTPException):
+            status = None
+        latency = time.perf_counter() - start - due
+        if due >= warmup:
+            with lock:
+                results[label].append((latency, status))
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for due, label, path in requests:
+            delay = start + due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, due, label, path)
+    return time.perf_counter() - start - warmup, results
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency * 1000 for latency, status in samples if status == 200)
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for _, status in samples if status != 200),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0,
+    }
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+        summary.update(p50_ms=round(cuts[49], 2), p95_ms=round(cuts[94], 2), p99_ms=round(cuts[98], 2),
+                       max_ms=round(latencies[-1], 2))
+    return summary
+
+
+def print_report(report, baseline=None):
+    print(f"\n  {'route':<24} {'reqs':>6} {'errs':>5} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, row in report['routes'].items():
+        line = (f"  {label:<24} {row['requests']:>6} {row['errors']:>5} {row['throughput_rps']:>7.1f} "
+                f"{row.get('p50_ms', 0):>9.1f} {row.get('p95_ms', 0):>9.1f} {row.get('p99_ms', 0):>9.1f}")
+        before = baseline and baseline['routes'].get(label)
+        if before and before.get('p95_ms'):
+            line += f"   p95 {row.get('p95_ms', 0) / before['p95_ms'] - 1:+.0%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the app under gunicorn')
+    parser.add_argument('--db', default=DEFAULT_DB, help='catalog database (default: %(default)s)')
+    parser.add_argument('--url', help='test this running server instead of starting gunicorn')
+    parser.add_argument('--port', type=int, default=PORT, help='port for gunicorn (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker (default: %(default)s)')
+    parser.add_argument('--worker-class', default='sync',
+                        help='gunicorn worker class; sync with --threads > 1 runs gthread (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=50, help='requests per second (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to send for (default: %(default)s)')
+    parser.add_argument('--warmup', type=float, default=3,
+                        help='leading seconds left out of the results (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help='most requests in flight at once (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the request mix (default: %(default)s)')
+    parser.add_argument('-o', '--output', help='write the report to this JSON file')
+    parser.add_argument('--compare', metavar='REPORT', help='earlier report to compare p95s against')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f'no such database: {args.db}')
+    sample = sample_values(args.db)
+    requests = schedule(sample, args.rate, args.warmup + args.duration, args.seed)
+
+    server = None
+    if args.url is None:
+        server = start_server(args)
+    try:
+        client = Client(args.url or f'http://127.0.0.1:{args.port}')
+        print(f"Sending {len(requests)} requests at {args.rate:g}/s for {args.warmup + args.duration:g}s...")
+        elapsed, results = run(client, requests, args.concurrency, args.warmup)
+    finally:
+        if server:
+            stop_server(server)
+
+    everything = [sample for samples in results.values() for sample in samples]
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'db': args.db,
+            'rows': sample['total'],
+            'server': args.url or {'workers': args.workers, 'threads': args.threads,
+                                   'worker_class': args.worker_class},
+            'rate': args.rate,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+        },
+        'overall': summarize(everything, elapsed),
+        'routes': {label: summarize(samples, elapsed) for label, samples in results.items() if samples},
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    overall = report['overall']
+    print(f"\n  overall: {overall['throughput_rps']:.1f} req/s, {overall['errors']} errors, "
+          f"p50 {overall.get('p50_ms', 0):.1f} ms, p95 {overall.get('p95_ms', 0):.1f} ms, "
+          f"p99 {overall.get('p99_ms', 0):.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 1 if overall['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Golf Ball Request Metrics
+Per-request SQL timing for the web tier, and the Prometheus metrics served
+at /metrics.
+
+Connections opened with TimedConnection time every statement - its
+execute and every fetch, since SQLite does most of a query's work while
+rows are fetched - and add it to the timer of the request running on that
+thread. app.py turns each request's timer into a Server-Timing header,
+records it in a Metrics registry and passes its statements to the
+slow-query log.
+
+Gunicorn runs several worker processes and a scrape reaches only one of
+them. When GOLF_METRICS_DIR is set, every worker regularly writes its
+totals there and /metrics adds up all the files, so the numbers cover the
+whole server. Without it each worker reports only its own requests.
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Request duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How often a worker writes its totals to the metrics directory
+FLUSH_INTERVAL = 1.0
+
+_local = threading.local()
+
+
+class RequestTimer:
+    """Where the time of one request went"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.render = 0.0
+        self._render_started = None
+        # [sql, parameters, seconds, connection] for every statement run
+        self.statements = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        queries = '1 query' if self.queries == 1 else f'{self.queries} queries'
+        return (f'db;dur={self.db * 1000:.1f};desc="{queries}", '
+                f'render;dur={self.render * 1000:.1f}, '
+                f'total;dur={self.elapsed() * 1000:.1f}')
+
+
+def start_request():
+    _local.timer = RequestTimer()
+    return _local.timer
+
+
+def current():
+    """The timer of the request running on this thread, if any"""
+    return getattr(_local, 'timer', None)
+
+
+def finish_request():
+    _local.timer = None
+
+
+def render_started():
+    timer = current()
+    if timer is not None:
+        timer._render_started = time.perf_counter()
+
+
+def render_finished():
+    timer = current()
+    if timer is not None and timer._render_started is not None:
+        timer.render += time.perf_counter() - timer._render_started
+        timer._render_started = None
+
+
+class TimedCursor(sqlite3.Cursor):
+    # The statement this cursor is running, as listed in the request timer;
+    # its fetches are added to it
+    _statement = None
+
+    def _start(self, sql, parameters):
+        timer = current()
+        self._statement = None
+        if timer is not None:
+            timer.queries += 1
+            self._statement = [sql, parameters, 0.0, self.connection]
+            timer.statements.append(self._statement)
+
+    def _timed(self, call, *args):
+        timer = current()
+        if timer is None:
+            return call(*args)
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            timer.db += elapsed
+            if self._statement is not None:
+                self._statement[2] += elapsed
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        self._start(script, None)
+        return self._timed(super().executescript, script)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose statements are timed"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The built-in shortcuts don't go through cursor()
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+
+class Metrics:
+    """Request counts, latency histograms and SQL totals per route"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # (route, method, status) -> count
+        self.requests = {}
+        # (route, method) -> [cumulative count per bucket..., count, sum of seconds]
+        self.durations = {}
+        # route -> [statements, seconds]
+        self.db = {}
+        self._flushed = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def observe(self, route, method, status, timer):
+        seconds = timer.elapsed()
+        with self._lock:
+            key = (route, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.durations.setdefault((route, method), [0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+            totals = self.db.setdefault(route, [0, 0.0])
+            totals[0] += timer.queries
+            totals[1] += timer.db
+        if self.directory and time.monotonic() - self._flushed >= FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': [list(key) + [value] for key, value in self.requests.items()],
+                'durations': [list(key) + [list(value)] for key, value in self.durations.items()],
+                'db': [[route] + list(value) for route, value in self.db.items()],
+            }
+
+    def flush(self):
+        """Write this process's totals to the metrics directory"""
+        self._flushed = time.monotonic()
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        # Threads of one worker may flush at the same time
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _combined(self):
+        """Totals of every worker that has written to the directory (this
+        one included), or just this process's"""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        requests, durations, db = {}, {}, {}
+        for snapshot in self._combined():
+            for route, method, status, count in snapshot['requests']:
+                key = (route, method, status)
+                requests[key] = requests.get(key, 0) + count
+            for route, method, values in snapshot['durations']:
+                total = durations.setdefault((route, method), [0] * len(values))
+                durations[(route, method)] = [a + b for a, b in zip(total, values)]
+            for route, statements, seconds in snapshot['db']:
+                total = db.setdefault(route, [0, 0.0])
+                total[0] += statements
+                total[1] += seconds
+
+        lines = [
+            '# HELP golf_http_requests_total Requests handled, by route, method and status.',
+            '# TYPE golf_http_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f'golf_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP golf_http_request_duration_seconds Time to handle a request, by route and method.',
+            '# TYPE golf_http_request_duration_seconds histogram',
+        ]
+        for (route, method), values in sorted(durations.items()):
+            for bound, count in zip(DURATION_BUCKETS, values):
+                lines.append(f'golf_http_request_duration_seconds_bucket'
+                             f'{_labels(route=route, method=method, le=repr(bound))} {count}')
+            lines.append(f'golf_http_request_duration_seconds_bucket'
+                         f'{_labels(route=route, method=method, le="+Inf")} {values[-2]}')
+            lines.append(f'golf_http_request_duration_seconds_count{_labels(route=route, method=method)} {values[-2]}')
+            lines.append(f'golf_http_request_duration_seconds_sum{_labels(route=route, method=method)} {values[-1]:.6f}')
+
+        lines += [
+            '# HELP golf_db_queries_total SQL statements run, by route.',
+            '# TYPE golf_db_queries_total counter',
+        ]
+        for route, (statements, _) in sorted(db.items()):
+            lines.append(f'golf_db_queries_total{_labels(route=route)} {statements}')
+        lines += [
+            '# HELP golf_db_seconds_total Time spent running SQL and fetching rows, by route.',
+            '# TYPE golf_db_seconds_total counter',
+        ]
+        for route, (_, seconds) in sorted(db.items()):
+            lines.append(f'golf_db_seconds_total{_labels(route=route)} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
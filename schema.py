@@ -0,0 +1,213 @@
+"""
+Golf Ball Catalog Schema Migrations
+Versioned upgrades for golf_balls_v2.db, tracked with PRAGMA user_version
+"""
+
+import sqlite3
+
+from catalog_db import RANDOM_VERSION_SQL
+
+# Columns covered by the full-text search index, in index order
+FTS_COLUMNS = ['ball_name', 'manufacturer', 'ball_name_format', 'specs', 'auction_remarks']
+
+
+def _create_search_index(conn):
+    """FTS5 index over the free-text columns, kept in sync by triggers"""
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{col}' for col in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{col}' for col in FTS_COLUMNS)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS golf_balls_fts USING fts5(
+            {columns},
+            content='golf_balls',
+            content_rowid='record_no',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS golf_balls_fts_ai AFTER INSERT ON golf_balls BEGIN
+            INSERT INTO golf_balls_fts(rowid, {columns})
+            VALUES (new.record_no, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS golf_balls_fts_ad AFTER DELETE ON golf_balls BEGIN
+            INSERT INTO golf_balls_fts(golf_balls_fts, rowid, {columns})
+            VALUES ('delete', old.record_no, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS golf_balls_fts_au AFTER UPDATE OF record_no, {columns} ON golf_balls BEGIN
+            INSERT INTO golf_balls_fts(golf_balls_fts, rowid, {columns})
+            VALUES ('delete', old.record_no, {old_values});
+            INSERT INTO golf_balls_fts(rowid, {columns})
+            VALUES (new.record_no, {new_values});
+        END
+    """)
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    """Repopulate the full-text index from golf_balls"""
+    conn.execute("INSERT INTO golf_balls_fts(golf_balls_fts) VALUES ('rebuild')")
+
+
+def _create_filter_indexes(conn):
+    """Composite indexes for the filter/sort combinations /api/search and /browse issue"""
+    # Equality filters paired with the default value_mid sort supersede
+    # the single-column versions
+    for name in ('idx_era', 'idx_pattern', 'idx_country'):
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    statements = [
+        # Folio is the browse page's primary filter; one index per sort key
+        'CREATE INDEX IF NOT EXISTS idx_folio_value ON golf_balls(folio, value_mid)',
+        'CREATE INDEX IF NOT EXISTS idx_folio_era_sort ON golf_balls(folio, era_sort)',
+        'CREATE INDEX IF NOT EXISTS idx_folio_name ON golf_balls(folio, ball_name)',
+        'CREATE INDEX IF NOT EXISTS idx_folio_condition ON golf_balls(folio, condition_grade)',
+        'CREATE INDEX IF NOT EXISTS idx_era_value ON golf_balls(era, value_mid)',
+        'CREATE INDEX IF NOT EXISTS idx_pattern_value ON golf_balls(cover_pattern, value_mid)',
+        'CREATE INDEX IF NOT EXISTS idx_country_value ON golf_balls(country, value_mid)',
+        'CREATE INDEX IF NOT EXISTS idx_condition_value ON golf_balls(condition_grade, value_mid)',
+        # Covers the era_sort ordering and /browse's era list
+        'CREATE INDEX IF NOT EXISTS idx_era_sort ON golf_balls(era_sort, era)',
+    ]
+    for statement in statements:
+        conn.execute(statement)
+
+
+def _create_stats_table(conn):
+    """Serialized aggregate snapshots, see catalog_stats.py"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_stats (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            built_at TEXT
+        )
+    """)
+
+
+def _create_meta_table(conn):
+    """Key/value catalog metadata, starting with the data version"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    conn.execute(f"INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('data_version', {RANDOM_VERSION_SQL})")
+
+
+def _create_facet_index(conn):
+    """Covering index for search facet counts: every facet column plus
+    value_mid, so filtered GROUP BYs never touch the table"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_facets
+        ON golf_balls(folio, era, cover_pattern, country, condition_grade, value_mid)
+    """)
+
+
+def _create_images_table(conn):
+    """Which stored (content-addressed) images belong to which ball, see
+    image_store.py"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ball_images (
+            id INTEGER PRIMARY KEY,
+            record_no INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            ext TEXT NOT NULL,
+            original_name TEXT,
+            uploaded_at TEXT,
+            UNIQUE (record_no, sha256)
+        )
+    """)
+
+
+def _add_image_metadata(conn):
+    """Size, dimensions, variants and a primary flag per ball image, so pages
+    never have to look at the upload folders"""
+    for column in ('size_bytes INTEGER', 'width INTEGER', 'height INTEGER', 'variants TEXT',
+                   'is_primary INTEGER NOT NULL DEFAULT 0'):
+        conn.execute(f'ALTER TABLE ball_images ADD COLUMN {column}')
+    # Each ball's first image is its primary one
+    conn.execute("""
+        UPDATE ball_images SET is_primary = 1
+        WHERE id IN (SELECT MIN(id) FROM ball_images GROUP BY record_no)
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_ball_images_primary
+        ON ball_images(record_no) WHERE is_primary = 1
+    """)
+
+
+def _create_folio_rows_table(conn):
+    """Which spreadsheet row (folio, source record number) each imported ball
+    came from, with a fingerprint of its content, so re-imports can diff"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folio_rows (
+            record_no INTEGER PRIMARY KEY,
+            folio INTEGER NOT NULL,
+            source_record_no INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            UNIQUE (folio, source_record_no)
+        )
+    """)
+
+
+def _create_image_hash_index(conn):
+    """Look up a stored image's rows by content hash, as the resizing route
+    and image_store.discard do"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ball_images_sha256 ON ball_images(sha256)
+    """)
+
+
+# (version, description, upgrade function) - append only, never renumber
+MIGRATIONS = [
+    (1, 'full-text search index', _create_search_index),
+    (2, 'composite filter/sort indexes', _create_filter_indexes),
+    (3, 'aggregate snapshot table', _create_stats_table),
+    (4, 'catalog metadata table', _create_meta_table),
+    (5, 'facet covering index', _create_facet_index),
+    (6, 'ball image table', _create_images_table),
+    (7, 'ball image metadata', _add_image_metadata),
+    (8, 'folio row keys', _create_folio_rows_table),
+    (9, 'image content hash index', _create_image_hash_index),
+]
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the database file"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(db_path):
+    """Apply any pending migrations to the database at db_path"""
+    # Autocommit mode so each migration runs in its own explicit transaction,
+    # DDL included
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = schema_version(conn)
+        for target, description, upgrade in MIGRATIONS:
+            if target <= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            # Another worker may have applied it while we waited for the lock
+            if schema_version(conn) >= target:
+                conn.execute('ROLLBACK')
+                version = schema_version(conn)
+                continue
+            print(f"Migrating schema to v{target}: {description}")
+            try:
+                upgrade(conn)
+                conn.execute(f'PRAGMA user_version = {target}')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            version = target
+        return version
+    finally:
+        conn.close()
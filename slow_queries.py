@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Golf Ball Slow-Query Log
+Statements the web tier ran that took longer than a threshold, written
+with their query plans to a rotating log, and a report that groups them
+by shape so it is clear which indexes are missing.
+
+Each log line is a JSON object: when, which route, how long, the SQL
+shape (whitespace collapsed and any literals replaced by ?), the
+parameters and the EXPLAIN QUERY PLAN output. A statement's time includes
+fetching its rows.
+
+    python slow_queries.py                    # report on slow_queries.log
+    python slow_queries.py --top 5 --route /api/search
+
+Gunicorn workers share the log file. A rotation can race between
+workers and lose a few lines, which is acceptable for a diagnostic log.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import statistics
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+DEFAULT_PATH = 'slow_queries.log'
+DEFAULT_THRESHOLD_MS = 100
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# String and number literals; the app binds its values, but a shape must
+# not depend on any that are inlined
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Plan lines worth pointing out in the report
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+VIRTUAL_SCAN_RE = re.compile(r'^SCAN (\w+) VIRTUAL TABLE')
+
+
+def normalize(sql):
+    """The statement's shape: literals replaced by ? and whitespace collapsed"""
+    return ' '.join(LITERAL_RE.sub('?', sql).split())
+
+
+def shape_id(shape):
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:10]
+
+
+def explain(conn, sql, parameters):
+    """EXPLAIN QUERY PLAN output, indented by nesting level"""
+    try:
+        # The plain sqlite3 method, so the EXPLAIN itself isn't timed
+        rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f'(no plan: {e})']
+    depth = {0: -1}
+    plan = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        plan.append('  ' * depth[node] + detail)
+    return plan
+
+
+class SlowQueryLog:
+    """Writes statements over threshold_ms to a rotating log file"""
+
+    def __init__(self, path=DEFAULT_PATH, threshold_ms=DEFAULT_THRESHOLD_MS):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        handler = RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+                                      encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        # Not registered with logging, so app-wide logging config can't
+        # redirect or silence it
+        self.logger = logging.Logger('slow_queries')
+        self.logger.addHandler(handler)
+
+    def record(self, statements, route):
+        """Log the statements of one request that were slow.
+        statements are [sql, parameters, seconds, connection] lists."""
+        for sql, parameters, seconds, conn in statements:
+            if seconds < self.threshold:
+                continue
+            shape = normalize(sql)
+            entry = {
+                'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'route': route,
+                'ms': round(seconds * 1000, 2),
+                'shape_id': shape_id(shape),
+                'shape': shape,
+                'params': parameters,
+                # executemany/executescript have no single parameter set
+                'plan': explain(conn, sql, parameters) if parameters is not None else [],
+            }
+            self.logger.info(json.dumps(entry, default=repr))
+
+
+# Report
+
+def log_files(path):
+    """The log and its rotated copies, oldest first"""
+    rotated = [f'{path}.{i}' for i in range(BACKUP_COUNT, 0, -1)]
+    return [p for p in rotated + [path] if os.path.exists(p)]
+
+
+def read_entries(path):
+    for file_path in log_files(path):
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def per_row_virtual_scans(plan):
+    """Virtual tables (the FTS index) that a plan - as explain() returns it -
+    searches once per row of an outer loop: a join loop after the first, or
+    one inside a correlated subquery. A virtual table that is the outer
+    loop, or in a subquery that runs once, is searched once."""
+    tables = []
+    loops = 0
+    correlated = None  # depth of the correlated subquery being read
+    for line in plan:
+        depth = (len(line) - len(line.lstrip(' '))) // 2
+        detail = line.strip()
+        if correlated is not None and depth <= correlated:
+            correlated = None
+        if detail.startswith('CORRELATED '):
+            correlated = depth
+            continue
+        virtual = VIRTUAL_SCAN_RE.match(detail)
+        if virtual and ((depth == 0 and loops > 0) or correlated is not None):
+            tables.append(virtual.group(1))
+        if depth == 0 and (detail.startswith('SCAN ') or detail.startswith('SEARCH ')):
+            loops += 1
+    return tables
+
+
+def plan_hints(plan):
+    """What in a query plan suggests an index is missing"""
+    hints = [f'{table} is searched once per row of an outer loop'
+             for table in per_row_virtual_scans(plan)]
+    for line in plan:
+        detail = line.strip()
+        scan = FULL_SCAN_RE.match(detail)
+        if scan:
+            hints.append(f'full scan of {scan.group(1)}')
+        if 'USE TEMP B-TREE' in detail:
+            hints.append(detail[len('USE TEMP B-TREE FOR '):].lower() + ' sorted in a temp b-tree')
+    return hints
+
+
+def group_by_shape(entries):
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['shape_id'], {
+            'shape': entry['shape'], 'ms': [], 'routes': Counter(), 'slowest': -1,
+        })
+        # Keep the slowest example
+        if entry['ms'] >= group['slowest']:
+            group['slowest'] = entry['ms']
+            group['params'] = entry['params']
+            group['plan'] = entry['plan']
+        group['ms'].append(entry['ms'])
+        group['routes'][entry['route']] += 1
+    return groups
+
+
+def report(groups, top):
+    ranked = sorted(groups.items(), key=lambda item: sum(item[1]['ms']), reverse=True)
+    print(f"{len(groups)} slow statement shapes, {sum(len(g['ms']) for g in groups.values())} occurrences")
+    for rank, (key, group) in enumerate(ranked[:top], 1):
+        times = group['ms']
+        print(f"\n#{rank} [{key}] {len(times)}x, total {sum(times) / 1000:.2f}s, "
+              f"median {statistics.median(times):.0f} ms, max {max(times):.0f} ms")
+        print(f"  routes: {', '.join(f'{route} ({n})' for route, n in group['routes'].most_common())}")
+        print(f"  {group['shape']}")
+        print(f"  slowest params: {json.dumps(group['params'])}")
+        if group['plan']:
+            print("  plan:")
+            for line in group['plan']:
+                print(f"    {line}")
+        for hint in plan_hints(group['plan']):
+            print(f"  ! {hint}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the slow-query log by statement shape')
+    parser.add_argument('log', nargs='?', default=os.environ.get('GOLF_SLOW_QUERY_LOG', DEFAULT_PATH),
+                        help='log file; its rotated copies are read too (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=20, help='shapes to show (default: %(default)s)')
+    parser.add_argument('--route', help='only statements run by this route, e.g. /api/search')
+    parser.add_argument('--min-ms', type=float, default=0, help='ignore entries faster than this')
+    args = parser.parse_args()
+
+    if not log_files(args.log):
+        print(f"No slow-query log at {args.log}")
+        return 1
+    entries = [e for e in read_entries(args.log)
+               if e['ms'] >= args.min_ms and (args.route is None or e['route'] == args.route)]
+    report(group_by_shape(entries), args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,6 +15,17 @@ document.addEventListener('DOMContentLoaded', function() {
 
 let currentPage = 1;
 let currentFilters = {};
+// Filters the facet counts on show were counted for; paging through the
+// same results doesn't need them again
+let facetFilters = null;
+
+// Filter dropdowns that show live per-option counts, keyed by facet name
+const FACET_SELECTS = {
+    era: 'filter-era',
+    pattern: 'filter-pattern',
+    country: 'filter-country',
+    condition: 'filter-condition'
+};
 
 function getCurrencySymbol(currency) {
     return currency === 'USD' ? '$' : '£';
@@ -69,8 +80,11 @@ function searchBalls(page = 1) {
     if (condition) params.append('condition', condition);
     if (minValue) params.append('min_value', minValue);
     if (maxValue) params.append('max_value', maxValue);
+    const filterKey = params.toString();
+    const wantFacets = filterKey !== facetFilters;
     params.append('page', page);
     params.append('per_page', '20');
+    if (wantFacets) params.append('facets', Object.keys(FACET_SELECTS).join(','));
     
     const container = document.getElementById('results-container');
     if (!container) return;
@@ -86,8 +100,13 @@ function searchBalls(page = 1) {
     fetch(`/api/search?${params}`)
         .then(response => response.json())
         .then(data => {
-            displayResults(data);
             updatePagination(data);
+            if (wantFacets) {
+                updateFacetCounts(data.facets);
+                facetFilters = filterKey;
+            }
+            if (data.total === 0 && query.trim()) return showSuggestions(query);
+            displayResults(data);
         })
         .catch(error => {
             console.error('Error:', error);
@@ -99,6 +118,21 @@ function searchBalls(page = 1) {
         });
 }
 
+// Nothing matched the search text exactly: show balls whose names look
+// like it instead, in case of a typo
+function showSuggestions(query) {
+    const params = new URLSearchParams({ q: query, limit: '20' });
+    return fetch(`/api/suggest?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            displayResults(data);
+            const countLabel = document.getElementById('results-count');
+            if (countLabel && data.results.length > 0) {
+                countLabel.textContent = `No exact matches - ${data.results.length} similar names`;
+            }
+        });
+}
+
 function displayResults(data) {
     const container = document.getElementById('results-container');
     const countLabel = document.getElementById('results-count');
@@ -120,6 +154,9 @@ function displayResults(data) {
                 <h4>${escapeHtml(ball.ball_name)}</h4>
                 <span class="card-era">${ball.era || 'Unknown era'}</span>
             </div>
+            ${ball.thumbnail_url ? `
+            <img class="card-image" src="${ball.thumbnail_url}" alt="${escapeHtml(ball.ball_name)}" loading="lazy">
+            ` : ''}
             <div class="card-body">
                 <div class="card-row">
                     <span class="card-label">Folio</span>
@@ -157,6 +194,24 @@ function displayResults(data) {
     `).join('');
 }
 
+function updateFacetCounts(facets) {
+    if (!facets) return;
+    
+    Object.entries(FACET_SELECTS).forEach(([facet, id]) => {
+        const select = document.getElementById(id);
+        if (!select || !facets[facet]) return;
+        
+        const counts = {};
+        facets[facet].forEach(item => { counts[item.value] = item.count; });
+        
+        Array.from(select.options).forEach(option => {
+            if (!option.value) return;
+            if (!option.dataset.label) option.dataset.label = option.textContent;
+            option.textContent = `${option.dataset.label} (${counts[option.value] || 0})`;
+        });
+    });
+}
+
 function updatePagination(data) {
     const container = document.getElementById('pagination');
     if (!container) return;